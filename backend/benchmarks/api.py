@@ -0,0 +1,355 @@
+"""Latency and throughput of the main API routes on synthetic datasets.
+
+Runs the FastAPI app in-process (httpx ASGI transport, no network) against
+an in-memory mongomock-motor database, or against a real mongod with
+--mongo-url. For every dataset size, with and without attachments, it seeds
+the database and times these scenarios:
+
+    list     GET  /api/demandas for one month, first page
+    search   GET  /api/demandas?search=<word>
+    create   POST /api/demandas (plus a reference file with attachments)
+    entrega  POST /api/demandas/{id}/entregas with a PNG upload
+    pdf      GET  /api/relatorio/{month}/{year}/pdf, rendered from scratch each time
+
+Latency percentiles (p50/p95/p99) and throughput are written as JSON for
+comparing versions; --compare checks the run against such a file. mongomock
+evaluates queries in Python and ignores indexes, so its numbers measure the
+application, not the database; use --mongo-url for end-to-end figures.
+
+Usage:
+    python benchmarks/api.py [--sizes 1k,10k,100k] [--attachments none,with]
+                             [--scenarios list,search,create,entrega,pdf]
+                             [--requests 200] [--pdf-requests 3] [--concurrency 8]
+                             [--mongo-url mongodb://localhost:27017]
+                             [--output results.json] [--compare baseline.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+SCENARIOS = ["list", "search", "create", "entrega", "pdf"]
+WARMUP_REQUESTS = 3
+PAGE_SIZE = 50
+SEED_BATCH = 1000
+
+WORDS = [
+    "arte", "vídeo", "cartaz", "evento", "campanha", "vacinação", "escola", "saúde",
+    "inauguração", "feira", "festival", "obra", "praça", "esporte", "cultura", "reunião",
+]
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    return int(float(value[:-1]) * 1000) if value.endswith("k") else int(value)
+
+
+def size_label(count: int) -> str:
+    return f"{count // 1000}k" if count % 1000 == 0 else str(count)
+
+
+def percentile(ordered: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, round(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def sample_png(width: int = 800, height: int = 600) -> bytes:
+    from PIL import Image
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+SAMPLE_PDF = b"%PDF-1.4\n" + b"0" * 64 * 1024 + b"\n%%EOF\n"
+
+
+def seed_attachments(server) -> dict:
+    """Store one reference file and one image entrega shared by all seeded demandas."""
+    png = sample_png()
+    image = {"type": "file", "filename": "arte.png", "mime_type": "image/png", **server.blob_store.put_bytes(png)}
+    image.update(server.build_image_derivatives(server.blob_store, image["file_id"]) or {})
+    referencia = {"type": "file", "filename": "briefing.pdf", "mime_type": "application/pdf",
+                  **server.blob_store.put_bytes(SAMPLE_PDF)}
+    return {"image": image, "referencia": referencia}
+
+
+def make_demanda(server, i: int, count: int, rng: random.Random, attachments) -> dict:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    created_at = start + timedelta(days=365 * i / count)
+    finished = rng.random() < 0.6
+    doc = {
+        "numero": f"#2025-{i + 1:03d}",
+        "solicitante": f"Solicitante {rng.randrange(40)}",
+        "demanda": " ".join(rng.choices(WORDS, k=12)).capitalize(),
+        "referencias": None,
+        "status": "Finalizado" if finished else rng.choice(server.STATUS_OPTIONS),
+        "entregas": None,
+        "created_at": created_at.isoformat(),
+        "month_year": server.get_month_year_key(created_at),
+        "updated_seq": i + 1,
+        "updated_at": created_at,
+    }
+    if attachments:
+        doc["referencias"] = [{"type": "link", "url": f"https://example.org/briefing/{i}"},
+                              dict(attachments["referencia"])]
+        if finished:
+            doc["entregas"] = [{**attachments["image"], "id": str(server.ObjectId()),
+                                "added_at": (created_at + timedelta(hours=4)).isoformat()}]
+    return doc
+
+
+async def seed(server, count: int, with_attachments: bool, rng: random.Random) -> list:
+    """Fill the database with ``count`` demandas spread over 2025; returns some ids."""
+    attachments = seed_attachments(server) if with_attachments else None
+    await server.solicitantes_collection.insert_many([
+        {"nome": f"Solicitante {n}", "nome_key": server.normalize_nome(f"Solicitante {n}")}
+        for n in range(40)
+    ])
+    ids = []
+    for first in range(0, count, SEED_BATCH):
+        docs = [make_demanda(server, i, count, rng, attachments) for i in range(first, min(first + SEED_BATCH, count))]
+        result = await server.demandas_collection.insert_many(docs)
+        ids.extend(str(object_id) for object_id in result.inserted_ids[:100])
+    settled = datetime.now(timezone.utc) - timedelta(minutes=1)
+    await server.counters_collection.insert_many([
+        {"_id": "demanda_2025", "seq": count},
+        {"_id": "demanda_changes", "seq": count, "updated_at": settled},
+    ])
+    return ids
+
+
+async def run_scenario(make_request, requests: int, concurrency: int, prepare=None, warmup: int = 0) -> dict:
+    for i in range(warmup):
+        if prepare:
+            await prepare(i)
+        await make_request(i)
+
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            if prepare:
+                await prepare(i)
+            started = time.perf_counter()
+            response = await make_request(i)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def scenario_requests(server, http, name: str, ids: list, rng: random.Random, with_attachments: bool):
+    """(make_request, prepare) for a scenario."""
+    months = [f"{m:02d}" for m in range(1, 13)]
+    png = sample_png(400, 300)
+
+    if name == "list":
+        return lambda i: http.get("/api/demandas", params={
+            "month": rng.choice(months), "year": "2025", "limit": PAGE_SIZE
+        }), None
+    if name == "search":
+        return lambda i: http.get("/api/demandas", params={"search": rng.choice(WORDS), "limit": PAGE_SIZE}), None
+    if name == "create":
+        def create(i):
+            files = {"referencia_files": ("briefing.pdf", SAMPLE_PDF, "application/pdf")} if with_attachments else None
+            return http.post("/api/demandas", data={
+                "solicitante": f"Solicitante {rng.randrange(40)}",
+                "demanda": " ".join(rng.choices(WORDS, k=12)),
+            }, files=files)
+        return create, None
+    if name == "entrega":
+        return lambda i: http.post(f"/api/demandas/{rng.choice(ids)}/entregas", files={
+            "entrega_files": ("arte.png", png, "image/png")
+        }), None
+    if name == "pdf":
+        month = "06"
+        async def invalidate(i):
+            # A new month version misses the report cache, so every request renders
+            await server.touch_month(f"{month}/2025")
+        return lambda i: http.get(f"/api/relatorio/{month}/2025/pdf"), invalidate
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+async def use_fresh_database(server, args, workdir: Path, label: str):
+    """Point the app at an empty database and drop per-database process state."""
+    if args.mongo_url:
+        await server.client.drop_database(server.DB_NAME)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        database = AsyncMongoMockClient()[server.DB_NAME]
+        for name in dir(server):
+            if name.endswith("_collection"):
+                setattr(server, name, database[getattr(server, name).name])
+        server.db = database
+    server.numero_allocator = server.NumeroAllocator(block_size=server.NUMERO_BLOCK_SIZE)
+    server.solicitantes_directory.invalidate()
+    server.report_cache = server.ReportCache(workdir / f"reports-{label}", max_bytes=server.REPORT_CACHE_MAX_BYTES)
+
+
+async def run_benchmarks(args, workdir: Path) -> list:
+    import httpx
+    import server
+
+    results = []
+    for count in args.sizes:
+        for with_attachments in args.attachments:
+            label = f"{size_label(count)}-{'with' if with_attachments else 'no'}-attachments"
+            rng = random.Random(args.seed)
+            await use_fresh_database(server, args, workdir, label)
+            started = time.perf_counter()
+            ids = await seed(server, count, with_attachments, rng)
+            print(f"{label}: seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            # The lifespan builds indexes and month stats, as on a real start
+            async with server.lifespan(server.app):
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+                    for name in args.scenarios:
+                        make_request, prepare = scenario_requests(server, http, name, ids, rng, with_attachments)
+                        pdf = name == "pdf"
+                        result = await run_scenario(
+                            make_request,
+                            requests=args.pdf_requests if pdf else args.requests,
+                            concurrency=1 if pdf else args.concurrency,
+                            prepare=prepare,
+                            warmup=0 if pdf else WARMUP_REQUESTS
+                        )
+                        result = {"dataset": size_label(count), "demandas": count,
+                                  "attachments": with_attachments, "scenario": name, **result}
+                        results.append(result)
+                        print(f"  {name:>8}: p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                              f"p99 {result['p99_ms']:9.2f} ms  {result['throughput_rps']:8.2f} req/s"
+                              f"{'  errors: %d' % result['errors'] if result['errors'] else ''}", file=sys.stderr)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print p95 changes against ``baseline``; False if any got slower than ``threshold``."""
+    def key(result):
+        return result["dataset"], result["attachments"], result["scenario"]
+
+    previous = {key(result): result for result in baseline["results"]}
+    ok = True
+    print(f"p95 vs {baseline['meta'].get('revision') or 'baseline'}:", file=sys.stderr)
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if not before or not before["p95_ms"]:
+            continue
+        change = result["p95_ms"] / before["p95_ms"] - 1
+        regressed = change > threshold
+        ok = ok and not regressed
+        dataset, attachments, scenario = key(result)
+        print(f"  {dataset:>5} {'with' if attachments else 'no':>4} attachments {scenario:>8}: "
+              f"{before['p95_ms']:9.2f} -> {result['p95_ms']:9.2f} ms ({change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,10k", help="dataset sizes, e.g. 1k,10k,100k")
+    parser.add_argument("--attachments", default="none,with", help="none, with, or both comma-separated")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--pdf-requests", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-url", help="benchmark a real mongod; its benchmark database is dropped")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare p95 against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase counted as a regression")
+    args = parser.parse_args()
+
+    args.sizes = [parse_size(size) for size in args.sizes.split(",")]
+    args.attachments = [{"none": False, "with": True}[value.strip()] for value in args.attachments.split(",")]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",")]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Configure the app before server.py is imported: throwaway storage, local events
+    workdir = Path(tempfile.mkdtemp(prefix="demandas-benchmark-"))
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = "demandas_benchmark"
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["REPORT_CACHE_DIR"] = str(workdir / "reports")
+    os.environ["EVENTS_BACKEND"] = "local"
+
+    try:
+        results = asyncio.run(run_benchmarks(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongod" if args.mongo_url else "mongomock",
+            "requests": args.requests,
+            "pdf_requests": args.pdf_requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if not compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Serialization cost of the demandas list, per 1,000 demandas.
+
+Compares the previous path (dicts rebuilt by hand, encoded by FastAPI's
+jsonable_encoder and the stdlib json module) with the current one
+(response models built by demanda_model, encoded with orjson).
+
+Usage:
+    python benchmarks/serialization.py [--count 1000] [--repeat 20]
+"""
+import os
+import sys
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# server.py connects lazily; the benchmark never talks to MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from server import DemandaPage, DemandaListItem, demanda_model, model_response
+
+
+def make_docs(count: int) -> list:
+    """Documents shaped like get_demandas reads them (LIST_PROJECTION applied)."""
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for i in range(count):
+        file_id = f"{i:064x}"
+        docs.append({
+            "_id": ObjectId(),
+            "numero": f"#2025-{i + 1:03d}",
+            "solicitante": f"Solicitante {i % 25}",
+            "demanda": "Arte para divulgação do evento na praça central, formatos feed e stories. " * 3,
+            "referencias": [
+                {"type": "link", "url": f"https://example.org/briefing/{i}"},
+                {"type": "file", "filename": f"briefing-{i}.pdf", "mime_type": "application/pdf",
+                 "file_id": file_id, "size": 182_344, "sha256": file_id},
+            ],
+            "status": "Finalizado" if i % 3 else "Em aberto",
+            "entregas": [
+                {"id": str(ObjectId()), "type": "file", "filename": f"arte-{i}.png", "mime_type": "image/png",
+                 "file_id": file_id, "size": 1_204_112, "sha256": file_id, "width": 1080, "height": 1350,
+                 "derivatives": {
+                     "report": {"file_id": file_id, "size": 60_211, "sha256": file_id,
+                                "mime_type": "image/jpeg", "width": 378, "height": 472},
+                     "thumb": {"file_id": file_id, "size": 9_870, "sha256": file_id,
+                               "mime_type": "image/jpeg", "width": 205, "height": 256},
+                 },
+                 "added_at": (start + timedelta(hours=i, minutes=30)).isoformat()},
+            ] if i % 3 else None,
+            "created_at": (start + timedelta(hours=i)).isoformat(),
+            "month_year": "01/2025",
+            "updated_seq": i,
+            "updated_at": start + timedelta(hours=i),
+        })
+    return docs
+
+
+def before(docs: list) -> bytes:
+    demandas = []
+    for doc in docs:
+        referencias = doc.get("referencias")
+        entregas = doc.get("entregas")
+        demandas.append({
+            "id": str(doc["_id"]),
+            "numero": doc["numero"],
+            "solicitante": doc["solicitante"],
+            "demanda": doc["demanda"],
+            "referencias": referencias,
+            "referencias_count": len(referencias or []),
+            "status": doc["status"],
+            "entregas": entregas,
+            "entregas_count": len(entregas or []),
+            "created_at": doc["created_at"],
+            "month_year": doc["month_year"]
+        })
+    content = {"items": demandas, "next_cursor": None, "sync_token": "token"}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def after(docs: list) -> bytes:
+    page = DemandaPage(
+        items=[demanda_model(doc, DemandaListItem) for doc in docs],
+        next_cursor=None,
+        sync_token="token"
+    )
+    return model_response(page).body
+
+
+def measure(func, docs: list, repeat: int) -> tuple:
+    func(docs)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(docs)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = make_docs(args.count)
+    per_thousand = 1000 / args.count
+    for name, func in (("before", before), ("after", after)):
+        seconds, size = measure(func, docs, args.repeat)
+        print(f"{name:>6}: {seconds * 1000 * per_thousand:8.2f} ms per 1,000 demandas ({size / 1024:.0f} KiB body)")
+
+
+if __name__ == "__main__":
+    main()
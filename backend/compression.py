@@ -0,0 +1,155 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Binary formats (PDF, images, archives) are already compressed, and event
+# streams must reach the client as soon as each event is written
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/csv", "text/css",
+                      "application/javascript", "image/svg+xml")
+
+# Files served for download: their strong ETag and byte ranges describe the
+# stored bytes, which a content coding would change
+DOWNLOAD_HEADERS = (b"accept-ranges", b"content-disposition")
+
+
+def serves_file(headers: dict) -> bool:
+    if any(name in headers for name in DOWNLOAD_HEADERS):
+        return True
+    etag = headers.get(b"etag")
+    return etag is not None and not etag.startswith(b"W/")
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            codings[coding.strip().lower()] = quality
+    return codings
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress text responses with brotli or gzip, as the client accepts.
+
+    Responses smaller than ``minimum_size``, already encoded, partial, of a
+    non-text type or serving a file (strong ETag, Accept-Ranges or
+    Content-Disposition) are passed through untouched. Bodies are compressed
+    as they stream, so large responses are never buffered whole.
+    """
+
+    def __init__(self, app, encodings=("br", "gzip"), minimum_size: int = 1024,
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.encodings = [encoding for encoding in encodings if encoding != "br" or brotli is not None]
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, scope):
+        headers = dict(scope["headers"])
+        accepted = parse_accept_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        for encoding in self.encodings:
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def compressor(self, encoding: str):
+        if encoding == "br":
+            return _Brotli(self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self.choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        buffered = b""
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, buffered, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = {key.lower(): value for key, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+                passthrough = (
+                    message["status"] != 200
+                    or b"content-encoding" in headers
+                    or content_type not in COMPRESSIBLE_TYPES
+                    or serves_file(headers)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                buffered += body
+                if len(buffered) < self.minimum_size:
+                    if more_body:
+                        return
+                    # Too small to be worth it: send as is
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": buffered})
+                    return
+
+                compressor = self.compressor(encoding)
+                headers = [
+                    (key, value) for key, value in start.get("headers", [])
+                    if key.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                headers.append((b"vary", b"Accept-Encoding"))
+                await send({**start, "headers": headers})
+                body, buffered = buffered, b""
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Events for one connected client, buffered up to ``maxsize``."""
+
+    def __init__(self, maxsize: int):
+        self._queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    async def get(self):
+        """Next event, or None once the subscriber has fallen too far behind."""
+        if self.lagged:
+            return None
+        return await self._queue.get()
+
+    def deliver(self, event: dict) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # A full queue means the reader is busy, so it will see this on its next get()
+            self.lagged = True
+            return False
+
+
+class LocalBroker:
+    """In-process fan-out of change events to subscribers.
+
+    Publishing is a non-blocking put into each subscriber's queue, so idle
+    clients cost one small queue each. A subscriber that falls ``queue_size``
+    events behind is dropped instead of slowing publishers down; its client
+    reconnects and resyncs.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @asynccontextmanager
+    async def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+
+    async def publish(self, event: dict):
+        self.fan_out(event)
+
+    def fan_out(self, event: dict):
+        for subscription in list(self._subscribers):
+            if not subscription.deliver(event):
+                self._subscribers.discard(subscription)
+
+
+class MongoBroker(LocalBroker):
+    """Fan-out across server processes through a capped collection.
+
+    Publishing inserts the event into ``collection``; every process tails it
+    with a single tailable cursor and fans the events out to its own
+    subscribers, so the database sees one reader per process, not per client.
+    """
+
+    def __init__(self, collection, queue_size: int = 100, size_bytes: int = 1024 * 1024):
+        super().__init__(queue_size)
+        self.collection = collection
+        self.size_bytes = size_bytes
+        self._task = None
+
+    async def start(self):
+        database = self.collection.database
+        if self.collection.name not in await database.list_collection_names():
+            try:
+                await database.create_collection(self.collection.name, capped=True, size=self.size_bytes)
+            except CollectionInvalid:
+                pass  # created by another process meanwhile
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, event: dict):
+        await self.collection.insert_one(dict(event))
+
+    async def _tail(self):
+        # Only events published from now on; older ones were for other clients
+        newest = await self.collection.find_one(sort=[("$natural", -1)])
+        last_id = newest["_id"] if newest else None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                async for event in cursor:
+                    last_id = event.pop("_id")
+                    self.fan_out(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event tailing failed; retrying")
+            # The cursor dies while the collection is empty; poll until it is not
+            await asyncio.sleep(1)
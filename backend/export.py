@@ -0,0 +1,119 @@
+import io
+import re
+import csv
+import zipfile
+from datetime import datetime
+
+import openpyxl
+
+EXPORT_COLUMNS = ["Número", "Solicitante", "Demanda", "Status", "Criada em", "Referências", "Entregas"]
+
+# Already compressed: deflating them again only costs CPU
+STORED_TYPES = ("image/", "video/", "audio/", "application/pdf", "application/zip",
+                "application/x-7z-compressed", "application/vnd.openxmlformats")
+
+
+def attachment_summary(items) -> str:
+    return "; ".join(
+        (item.get("url") if item.get("type") == "link" else item.get("filename")) or ""
+        for item in items or []
+    )
+
+
+def export_row(doc: dict) -> list:
+    """One summary row per demanda, in EXPORT_COLUMNS order."""
+    created_at = doc.get("created_at") or ""
+    try:
+        created_at = datetime.fromisoformat(created_at).strftime("%d/%m/%Y %H:%M")
+    except ValueError:
+        pass
+    return [
+        doc["numero"],
+        doc["solicitante"],
+        doc["demanda"],
+        doc["status"],
+        created_at,
+        attachment_summary(doc.get("referencias")),
+        attachment_summary(doc.get("entregas")),
+    ]
+
+
+def csv_line(row: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+def build_xlsx(rows) -> bytes:
+    """Summary workbook for ``rows``."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Demandas")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def archive_name(name: str) -> str:
+    """Make ``name`` safe as a single path component inside an archive."""
+    name = re.sub(r'[\x00-\x1f/\\:*?"<>|]+', "_", name).strip(" .")
+    return name or "_"
+
+
+class _Drain:
+    """Write-only sink without tell/seek, so zipfile writes a streamable archive."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """ZIP archive built member by member whose bytes are drained as they are written.
+
+    Members use data descriptors, so nothing has to be known before a file is
+    written and only the pending output is ever held in memory.
+    """
+
+    def __init__(self):
+        self._sink = _Drain()
+        self._zip = zipfile.ZipFile(self._sink, "w", allowZip64=True)
+        self._names = set()
+
+    def open(self, name: str, mime_type: str = None, date_time=None):
+        """Writable handle for a new member; clashing names get a numeric suffix."""
+        stem, dot, ext = name.rpartition(".")
+        if not dot or "/" in ext:
+            stem, dot, ext = name, "", ""
+        candidate, n = name, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{stem} ({n}){dot}{ext}"
+        self._names.add(candidate)
+
+        info = zipfile.ZipInfo(candidate, date_time=(date_time or datetime.now()).timetuple()[:6])
+        stored = (mime_type or "").startswith(STORED_TYPES)
+        info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        # Sizes are unknown up front; zip64 keeps members over 2 GiB valid
+        return self._zip.open(info, "w", force_zip64=True)
+
+    def drain(self) -> bytes:
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the remaining bytes."""
+        self._zip.close()
+        return self._sink.take()
@@ -0,0 +1,50 @@
+import io
+
+from PIL import Image, ImageOps
+
+# The report reserves a 12x8 cm slot per image; 150 dpi is plenty for print
+REPORT_MAX_SIZE = (709, 472)
+THUMB_MAX_SIZE = (256, 256)
+JPEG_QUALITY = 80
+
+
+def _encode_jpeg(img: Image.Image, max_size) -> tuple:
+    derivative = img.copy()
+    derivative.thumbnail(max_size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    derivative.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue(), derivative.size
+
+
+def build_image_derivatives(store, blob_id: str):
+    """Decode an uploaded image once and store its report and thumbnail versions.
+
+    Returns the metadata to merge into the attachment reference, or None when
+    the blob is not an image Pillow can read.
+    """
+    try:
+        with Image.open(store.path_for(blob_id)) as original:
+            img = ImageOps.exif_transpose(original)
+            width, height = img.size
+            # JPEG has no alpha: flatten transparent images onto white paper
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, "white")
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            derivatives = {}
+            for name, max_size in (("report", REPORT_MAX_SIZE), ("thumb", THUMB_MAX_SIZE)):
+                data, (d_width, d_height) = _encode_jpeg(img, max_size)
+                derivatives[name] = {
+                    **store.put_bytes(data),
+                    "mime_type": "image/jpeg",
+                    "width": d_width,
+                    "height": d_height
+                }
+    except Exception:
+        return None
+
+    return {"width": width, "height": height, "derivatives": derivatives}
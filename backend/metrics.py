@@ -0,0 +1,234 @@
+import time
+import threading
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        lines = super().render()
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = super().render()
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LABEL)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {values[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format.
+
+    Asking for a metric that already exists returns it, so components can
+    declare what they record without coordinating who creates it.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def route_template(scope) -> str:
+    """Path template of the route that will handle ``scope``, e.g. /api/demandas/{demanda_id}.
+
+    Unknown paths share one label so scanners cannot blow up the series count.
+    """
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Record latency, response size and in-flight count per route template.
+
+    Latency runs until the last body chunk is sent, so streamed responses are
+    measured whole; sizes are the bytes put on the wire.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "Time from request to last response byte.",
+            ["method", "route", "status"]
+        )
+        self.size = registry.histogram(
+            "http_response_size_bytes", "Response body size as sent.",
+            ["method", "route"], buckets=SIZE_BUCKETS
+        )
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight", "Requests being handled, including open streams.", ["route"]
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope)
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_measured(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        self.in_flight.inc(route=route)
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            self.in_flight.dec(route=route)
+            self.duration.observe(time.perf_counter() - started, method=method, route=route, status=status)
+            self.size.observe(size, method=method, route=route)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener timing every command per collection and operation."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.duration = registry.histogram(
+            "mongodb_command_duration_seconds", "MongoDB command round trips as seen by the driver.",
+            ["collection", "command", "outcome"], buckets=MONGO_BUCKETS
+        )
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        else:
+            collection = command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = \
+                collection if isinstance(collection, str) else "-"
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        self.duration.observe(
+            event.duration_micros / 1e6, collection=collection, command=event.command_name, outcome=outcome
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
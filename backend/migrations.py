@@ -0,0 +1,133 @@
+"""One-off data migrations for the demandas collection.
+
+Usage:
+    python migrations.py embedded-files [--dry-run]
+    python migrations.py image-derivatives [--dry-run]
+    python migrations.py monthly-stats
+    python migrations.py entrega-ids [--dry-run]
+    python migrations.py search-tokens
+"""
+import sys
+import asyncio
+
+from server import (
+    demandas_collection, blob_store, rebuild_month_stats, backfill_search_tokens, backfill_embedded_files,
+    backfill_entrega_ids, next_change, ATTACHMENT_FIELDS,
+)
+from images import build_image_derivatives
+
+
+async def migrate_embedded_files(dry_run: bool = False):
+    if not dry_run:
+        # Also done on every server start
+        moved = await backfill_embedded_files()
+        print(f"moved {moved} file(s) to {blob_store.root}")
+        return
+
+    query = {"$or": [{f"{field}.file_data": {"$exists": True}} for field in ATTACHMENT_FIELDS]}
+    projection = {f"{field}.file_data": 1 for field in ATTACHMENT_FIELDS}
+    documents = 0
+    files = 0
+    async for doc in demandas_collection.find(query, projection, batch_size=20):
+        for field in ATTACHMENT_FIELDS:
+            files += sum(1 for item in doc.get(field) or [] if item.get("file_data"))
+        documents += 1
+    print(f"{documents} demanda(s) scanned, would move {files} file(s) to {blob_store.root}")
+
+
+def _needs_derivatives(item) -> bool:
+    return (
+        item.get("type") == "file"
+        and item.get("file_id")
+        and (item.get("mime_type") or "").startswith("image/")
+        and "derivatives" not in item
+    )
+
+
+async def migrate_image_derivatives(dry_run: bool = False):
+    query = {"$or": [
+        {field: {"$elemMatch": {"mime_type": {"$regex": "^image/"}, "derivatives": {"$exists": False}}}}
+        for field in ATTACHMENT_FIELDS
+    ]}
+    projection = {"updated_seq": 1, **{field: 1 for field in ATTACHMENT_FIELDS}}
+    cursor = demandas_collection.find(query, projection, batch_size=20)
+
+    documents = 0
+    images = 0
+    skipped = 0
+    async for doc in cursor:
+        update = {}
+        for field in ATTACHMENT_FIELDS:
+            items = doc.get(field) or []
+            pending = [item for item in items if _needs_derivatives(item)]
+            images += len(pending)
+            if dry_run or not pending:
+                continue
+            for item in pending:
+                image_meta = await asyncio.to_thread(build_image_derivatives, blob_store, item["file_id"])
+                # Mark unreadable images too, so they are not retried forever
+                item.update(image_meta or {"derivatives": None})
+            update[field] = items
+        if update:
+            # Whole arrays are written back: only if nothing changed them since
+            # they were read; stamped so delta sync picks up the derivatives
+            result = await demandas_collection.update_one(
+                {"_id": doc["_id"], "updated_seq": doc.get("updated_seq")},
+                {"$set": {**update, **await next_change()}}
+            )
+            skipped += 1 - result.modified_count
+        documents += 1
+
+    action = "would process" if dry_run else "processed"
+    print(f"{documents} demanda(s) scanned, {action} {images} image(s)")
+    if skipped:
+        print(f"{skipped} demanda(s) changed while processing; run again to finish them")
+
+
+async def migrate_monthly_stats(dry_run: bool = False):
+    if dry_run:
+        print("monthly-stats has no dry run; it only rewrites derived counters")
+        return
+    await rebuild_month_stats()
+    print("monthly_stats rebuilt from demandas")
+
+
+async def migrate_entrega_ids(dry_run: bool = False):
+    if not dry_run:
+        # Also done on every server start
+        assigned = await backfill_entrega_ids()
+        print(f"assigned {assigned} entrega id(s)")
+        return
+
+    query = {"entregas": {"$elemMatch": {"id": {"$exists": False}}}}
+    documents = 0
+    entregas = 0
+    async for doc in demandas_collection.find(query, {"entregas.id": 1}, batch_size=100):
+        entregas += sum(1 for item in doc["entregas"] if "id" not in item)
+        documents += 1
+    print(f"{documents} demanda(s) scanned, would assign {entregas} entrega id(s)")
+
+
+async def migrate_search_tokens(dry_run: bool = False):
+    if dry_run:
+        print("search-tokens has no dry run; it only rewrites the search index")
+        return
+    # Startup only indexes demandas that have no tokens; this re-tokenizes all
+    updated = await backfill_search_tokens(rebuild=True)
+    print(f"search_tokens rebuilt, {updated} demanda(s) changed")
+
+
+MIGRATIONS = {
+    "embedded-files": migrate_embedded_files,
+    "image-derivatives": migrate_image_derivatives,
+    "monthly-stats": migrate_monthly_stats,
+    "entrega-ids": migrate_entrega_ids,
+    "search-tokens": migrate_search_tokens,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in MIGRATIONS:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(MIGRATIONS[sys.argv[1]](dry_run="--dry-run" in sys.argv[2:]))
@@ -0,0 +1,278 @@
+import io
+import re
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import monitoring
+
+logger = logging.getLogger("demandas.slow")
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+MAX_FILTER_CHARS = 500
+
+
+class RequestTrace:
+    """MongoDB work done on behalf of one request."""
+
+    __slots__ = ("commands", "documents", "mongo_seconds")
+
+    def __init__(self):
+        self.commands = 0
+        self.documents = 0
+        self.mongo_seconds = 0.0
+
+
+# Set by ProfilingMiddleware; Motor copies the context into its worker
+# threads, so command listeners see the trace of the request they serve
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class SlowLog:
+    """Most recent operations over a latency threshold, also sent to the log."""
+
+    def __init__(self, request_ms: float, query_ms: float, size: int = 200):
+        self.request_ms = request_ms
+        self.query_ms = query_ms
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, duration_ms: float, **details):
+        entry = {
+            "kind": kind,
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 1),
+            **details,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning("Slow %s (%.0f ms): %s", kind, duration_ms, json.dumps(details, default=str))
+
+    def entries(self) -> list:
+        with self._lock:
+            return list(reversed(self._entries))
+
+
+def command_filter(command_name: str, command) -> object:
+    """The part of a command that says which documents it reads or writes."""
+    if command_name in ("find", "count", "distinct"):
+        return {key: command[key] for key in ("filter", "query", "sort", "projection", "limit", "key") if key in command}
+    if command_name == "aggregate":
+        return command.get("pipeline")
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name == "update":
+        return [update.get("q") for update in command.get("updates", [])[:5]]
+    if command_name == "delete":
+        return [delete.get("q") for delete in command.get("deletes", [])[:5]]
+    return None
+
+
+def reply_documents(command_name: str, reply) -> int:
+    """Number of documents a command returned or touched."""
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    return int(reply.get("n", 0))
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """Attribute command time and document counts to the current request, and
+    record commands slower than the slow log's query threshold."""
+
+    def __init__(self, slow_log: SlowLog):
+        self.slow_log = slow_log
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        else:
+            collection = command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else None,
+                command_filter(event.command_name, command),
+            )
+
+    def succeeded(self, event):
+        self._finish(event, reply_documents(event.command_name, event.reply))
+
+    def failed(self, event):
+        self._finish(event, 0, error=str(event.failure.get("errmsg", event.failure)))
+
+    def _finish(self, event, documents: int, error: str = None):
+        with self._lock:
+            collection, filter_ = self._pending.pop((event.connection_id, event.request_id), (None, None))
+        seconds = event.duration_micros / 1e6
+
+        trace = current_trace.get()
+        if trace is not None:
+            trace.commands += 1
+            trace.documents += documents
+            trace.mongo_seconds += seconds
+
+        if self.slow_log.query_ms and seconds * 1000 >= self.slow_log.query_ms:
+            details = {"collection": collection, "command": event.command_name, "documents": documents}
+            if filter_ is not None:
+                details["filter"] = json.dumps(filter_, default=str, ensure_ascii=False)[:MAX_FILTER_CHARS]
+            if error:
+                details["error"] = error
+            self.slow_log.record("query", seconds * 1000, **details)
+
+
+class ProfileStore:
+    """Directory of saved request profiles, newest ``keep`` kept.
+
+    Each profile is a pstats dump (``<id>.prof``) with a JSON sidecar
+    describing the request it was taken from.
+    """
+
+    def __init__(self, root, keep: int):
+        self.root = Path(root)
+        self.keep = keep
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, profile_id: str, suffix: str = ".prof") -> Path:
+        if not _PROFILE_ID_RE.match(profile_id or ""):
+            raise ValueError(f"Invalid profile id: {profile_id!r}")
+        return self.root / f"{profile_id}{suffix}"
+
+    def save(self, profile_id: str, profile: cProfile.Profile, info: dict):
+        profile.dump_stats(str(self.path_for(profile_id)))
+        self.path_for(profile_id, ".json").write_text(json.dumps({"id": profile_id, **info}), encoding="utf-8")
+        self._prune()
+
+    def list(self) -> list:
+        profiles = []
+        for path in self.root.glob("*.json"):
+            try:
+                profiles.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda info: info.get("at", ""), reverse=True)
+
+    def text(self, profile_id: str, limit: int = 60) -> str:
+        """Top functions by cumulative time, as printed by pstats."""
+        output = io.StringIO()
+        stats = pstats.Stats(str(self.path_for(profile_id)), stream=output)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def _prune(self):
+        sidecars = sorted(self.root.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for sidecar in sidecars[self.keep:]:
+            for path in (sidecar, sidecar.with_suffix(".prof")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+class ProfilingMiddleware:
+    """Trace every request's MongoDB work, log slow requests, and profile on demand.
+
+    With a ``store``, a request carrying an ``X-Profile: 1`` header or a
+    ``profile=1`` query parameter runs under cProfile and the result is saved
+    under the id returned in ``X-Profile-Id``. cProfile sees everything the
+    event loop thread runs, so only one request is profiled at a time and
+    concurrent requests may still show up in it; work done in thread pools
+    or report worker processes is not included.
+
+    Streamed responses (no Content-Length: event streams, exports) are held
+    to the slow threshold up to their first byte only; how long the client
+    keeps them open says nothing about the server.
+    """
+
+    def __init__(self, app, slow_log: SlowLog, store: ProfileStore = None):
+        self.app = app
+        self.slow_log = slow_log
+        self.store = store
+        self._profiling = False
+
+    def wants_profile(self, scope) -> bool:
+        if self.store is None or self._profiling:
+            return False
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile", b"").strip() in (b"1", b"true"):
+            return True
+        return re.search(rb"(^|&)profile=(1|true)(&|$)", scope.get("query_string", b"")) is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        status = 500
+        size = 0
+        streamed_at = None
+        profile_id = None
+        profile = None
+        if self.wants_profile(scope):
+            profile_id = uuid.uuid4().hex
+            profile = cProfile.Profile()
+            self._profiling = True
+
+        async def send_traced(message):
+            nonlocal status, size, streamed_at
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if not any(key.lower() == b"content-length" for key, _ in message.get("headers", [])):
+                    streamed_at = time.perf_counter()
+                if profile_id:
+                    message = {**message, "headers": [
+                        *message.get("headers", []), (b"x-profile-id", profile_id.encode("latin-1"))
+                    ]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            if profile:
+                profile.disable()
+                self._profiling = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            current_trace.reset(token)
+            details = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "bytes": size,
+                "mongo_commands": trace.commands,
+                "mongo_documents": trace.documents,
+                "mongo_ms": round(trace.mongo_seconds * 1000, 1),
+            }
+            if profile:
+                try:
+                    self.store.save(profile_id, profile, {
+                        "at": datetime.now(timezone.utc).isoformat(), "duration_ms": round(duration_ms, 1), **details
+                    })
+                except OSError:
+                    logger.exception("Could not save profile %s", profile_id)
+            if streamed_at is not None:
+                details["total_ms"] = round(duration_ms, 1)
+                duration_ms = (streamed_at - started) * 1000
+            if self.slow_log.request_ms and duration_ms >= self.slow_log.request_ms:
+                self.slow_log.record("request", duration_ms, **details, profile_id=profile_id)
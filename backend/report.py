@@ -0,0 +1,408 @@
+import io
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib import colors
+
+
+class ReportTimeout(Exception):
+    """Raised when a report takes longer than the renderer allows."""
+
+
+def get_month_year_pt(month_year: str):
+    months = {
+        '01': 'Janeiro', '02': 'Fevereiro', '03': 'Março', '04': 'Abril',
+        '05': 'Maio', '06': 'Junho', '07': 'Julho', '08': 'Agosto',
+        '09': 'Setembro', '10': 'Outubro', '11': 'Novembro', '12': 'Dezembro'
+    }
+    try:
+        parts = month_year.split('/')
+        return f"{months[parts[0]]} de {parts[1]}"
+    except:
+        return month_year
+
+
+def report_styles() -> dict:
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=TA_CENTER,
+        spaceAfter=6,
+        fontName='Times-Bold'
+    )
+
+    header_style = ParagraphStyle(
+        'Header',
+        parent=styles['Normal'],
+        fontSize=11,
+        alignment=TA_CENTER,
+        spaceAfter=3,
+        fontName='Times-Roman'
+    )
+
+    section_title_style = ParagraphStyle(
+        'SectionTitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        alignment=TA_LEFT,
+        spaceBefore=15,
+        spaceAfter=6,
+        fontName='Times-Bold'
+    )
+
+    body_style = ParagraphStyle(
+        'Body',
+        parent=styles['Normal'],
+        fontSize=10,
+        alignment=TA_LEFT,
+        spaceAfter=8,
+        fontName='Times-Roman',
+        leading=14
+    )
+
+    small_style = ParagraphStyle(
+        'Small',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=TA_LEFT,
+        spaceAfter=4,
+        fontName='Times-Roman',
+        textColor=colors.gray
+    )
+
+    return {
+        'title': title_style,
+        'header': header_style,
+        'section_title': section_title_style,
+        'body': body_style,
+        'small': small_style,
+    }
+
+
+def header_flowables(month_year: str, summary: dict, styles: dict) -> list:
+    title_style = styles['title']
+    header_style = styles['header']
+    body_style = styles['body']
+
+    elements = []
+
+    # Header
+    month_year_pt = get_month_year_pt(month_year)
+    elements.append(Paragraph(f"Relatório de Produção", title_style))
+    elements.append(Paragraph(f"{month_year_pt}", title_style))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph("Nome: Gustavo Ferreira Santos", header_style))
+    elements.append(Paragraph("Cargo: Assessor Especial 3", header_style))
+    elements.append(Paragraph("Secretária: Sheila Cristina", header_style))
+    elements.append(Paragraph("Prefeitura Municipal de Canaã dos Carajás", header_style))
+    elements.append(Spacer(1, 20))
+
+    # Summary
+    elements.append(Paragraph(
+        f"Total de demandas: {summary['total']} | Finalizadas: {summary['finalizadas']}", body_style
+    ))
+    elements.append(Spacer(1, 20))
+    return elements
+
+
+def demanda_flowables(index: int, doc: dict, styles: dict, timings: dict = None) -> list:
+    section_title_style = styles['section_title']
+    body_style = styles['body']
+    small_style = styles['small']
+
+    elements = []
+    elements.append(Paragraph(f"─────────────────────────────────────────", body_style))
+    section_title = Paragraph(f"<b>{doc['numero']}</b> — {doc['solicitante']}", section_title_style)
+    section_title.demanda_index = index
+    elements.append(section_title)
+    elements.append(Paragraph(f"Status: {doc['status']}", small_style))
+    elements.append(Spacer(1, 4))
+    elements.append(Paragraph(f"<b>Demanda:</b> {doc['demanda']}", body_style))
+
+    # Referencias
+    referencias = doc.get("referencias") or []
+    if referencias:
+        ref_text = []
+        for ref in referencias:
+            if ref["type"] == "link":
+                ref_text.append(f"Link: {ref['url']}")
+            else:
+                ref_text.append(f"Arquivo: {ref['filename']}")
+        elements.append(Paragraph(f"<b>Referências:</b> {'; '.join(ref_text)}", small_style))
+
+    # Entregas with images
+    entregas = doc.get("entregas") or []
+    if entregas:
+        elements.append(Paragraph("<b>Entregas:</b>", body_style))
+        for entrega in entregas:
+            if entrega["type"] == "link":
+                elements.append(Paragraph(f"• Link: {entrega['url']}", small_style))
+            else:
+                elements.append(Paragraph(f"• Arquivo: {entrega['filename']}", small_style))
+                started = time.perf_counter()
+                elements.extend(entrega_image_flowables(entrega))
+                if timings is not None:
+                    timings["images"] += time.perf_counter() - started
+
+    elements.append(Spacer(1, 10))
+    return elements
+
+
+def entrega_image_flowables(entrega: dict) -> list:
+    """Image of a file entrega, if it is one that can be displayed."""
+    flowables = []
+    if entrega.get("image_path"):
+        try:
+            if entrega.get("image_size"):
+                # Pre-sized JPEG derivative: embedded as-is, no decoding
+                img_source = entrega["image_path"]
+                img_width, img_height = entrega["image_size"]
+            else:
+                with open(entrega["image_path"], "rb") as fh:
+                    img_source = io.BytesIO(fh.read())
+                img_width, img_height = PILImage.open(img_source).size
+                img_source.seek(0)
+
+            max_width = 12*cm
+            max_height = 8*cm
+
+            ratio = min(max_width/img_width, max_height/img_height)
+            new_width = img_width * ratio
+            new_height = img_height * ratio
+
+            img = Image(img_source, width=new_width, height=new_height)
+            flowables.append(Spacer(1, 6))
+            flowables.append(img)
+        except Exception:
+            pass
+    return flowables
+
+
+class FlowableStream(list):
+    """Flowable list that refills itself from ``chunks`` as ``build()`` consumes it.
+
+    ``build()`` pops flowables off the front of the list until it is empty, so
+    only the chunk being laid out has to be in memory at any time.
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+
+    def __len__(self):
+        while not list.__len__(self):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self.extend(chunk)
+        return list.__len__(self)
+
+
+def render_monthly_pdf(month_year: str, summary: dict, batches, output_path: str, progress=None):
+    """Render the "Relatório de Produção" for a month into ``output_path``.
+
+    ``batches`` is a queue of lists of plain demanda snapshots (see
+    ``report_snapshot`` in server.py) terminated by None, so the caller can
+    stream documents from the database while the worker lays them out.
+    Image entregas carry an ``image_path`` into the blob store instead of
+    their bytes. ``summary`` holds the header totals, and ``progress.value``,
+    if given, is set to the number of demandas laid out so far.
+
+    Returns the seconds spent preparing images (reading and sizing them) and
+    on the rest of ``build()``, time spent waiting for batches excluded.
+    """
+    pdf_doc = SimpleDocTemplate(
+        output_path,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    styles = report_styles()
+    timings = {"images": 0.0, "waiting": 0.0}
+
+    def next_batch():
+        started = time.perf_counter()
+        batch = batches.get()
+        timings["waiting"] += time.perf_counter() - started
+        return batch
+
+    def chunks():
+        yield header_flowables(month_year, summary, styles)
+        index = 0
+        for batch in iter(next_batch, None):
+            for doc in batch:
+                index += 1
+                yield demanda_flowables(index, doc, styles, timings)
+
+    if progress is not None:
+        def after_flowable(flowable):
+            index = getattr(flowable, "demanda_index", None)
+            if index is not None:
+                progress.value = index - 1
+        pdf_doc.afterFlowable = after_flowable
+
+    started = time.perf_counter()
+    pdf_doc.build(FlowableStream(chunks()))
+    elapsed = time.perf_counter() - started
+    if progress is not None:
+        progress.value = summary['total']
+    return {"images": timings["images"], "layout": elapsed - timings["images"] - timings["waiting"]}
+
+
+class ReportRenderer:
+    """Runs report rendering in a bounded pool of worker processes.
+
+    At most ``max_workers`` reports render at once; further requests wait for
+    a free slot. A render that exceeds ``timeout`` seconds raises
+    ``ReportTimeout`` and the pool is recycled so the stuck worker is killed
+    (renders running alongside it fail with ``BrokenProcessPool``).
+    """
+
+    def __init__(self, max_workers: int, timeout: float):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self._manager = None
+        self._slots = asyncio.Semaphore(max_workers)
+        # spawn keeps the workers free of the server's event loop and Mongo threads
+        self._mp_context = multiprocessing.get_context("spawn")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._mp_context
+            )
+        return self._executor
+
+    def _get_manager(self):
+        if self._manager is None:
+            self._manager = self._mp_context.Manager()
+        return self._manager
+
+    def progress_counter(self):
+        """Shared integer a worker can update while the caller polls it."""
+        return self._get_manager().Value("i", 0)
+
+    def batch_queue(self, maxsize: int):
+        """Bounded queue the caller fills with work while the worker drains it."""
+        return self._get_manager().Queue(maxsize)
+
+    async def run(self, func, *args):
+        async with self._slots:
+            executor = self._get_executor()
+            future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self._recycle(executor)
+                raise ReportTimeout(f"Report rendering exceeded {self.timeout:g}s")
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        if self._executor is executor:
+            self._executor = None
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+class ReportCache:
+    """Size-bounded LRU cache of rendered report files keyed by (month_year, version).
+
+    Reports are kept as files so large months never have to be held in
+    memory. Storing a newer version of a month drops the older ones right
+    away, since a version bump means they can never be served again.
+
+    ``root`` may be shared with other processes (server workers, scripts), so
+    each cache writes into its own directory under it, created on first use
+    and removed by ``close``; nothing else under ``root`` is ever touched.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.directory = None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def new_path(self) -> str:
+        """Path for a report about to be rendered, on the cache's filesystem."""
+        with self._lock:
+            if self.directory is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self.directory = Path(tempfile.mkdtemp(prefix="cache-", dir=self.root))
+            return str(self.directory / f"{uuid.uuid4().hex}.pdf")
+
+    def close(self):
+        """Drop every cached report along with this cache's directory."""
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+            if self.directory is not None:
+                # Only renders of this process live here
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+    def get(self, month_year: str, version: int):
+        with self._lock:
+            key = (month_year, version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            return None
+
+    def put(self, month_year: str, version: int, path: str) -> bool:
+        """Take ownership of the rendered file at ``path``.
+
+        Returns False, leaving the file to the caller, if it is too big to cache.
+        """
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == month_year and key[1] <= version]:
+                self._evict(key)
+            self._entries[(month_year, version)] = (path, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+        return True
+
+    def _evict(self, key):
+        # Responses already streaming keep their open handle to the unlinked file
+        path, size = self._entries.pop(key)
+        self._size -= size
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
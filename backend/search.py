@@ -0,0 +1,58 @@
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"[0-9a-z]+")
+MAX_QUERY_TERMS = 8
+
+# Dropped from queries with other terms; documents still index them so a
+# query made only of them can match
+STOPWORDS = frozenset("""
+    a ao aos as com da das de do dos e em na nas no nos o os ou para pela pelas
+    pelo pelos por que se sem sob sobre um uma umas uns
+""".split())
+
+# Fields whose words are indexed, in order of importance
+SEARCH_FIELDS = ("numero", "solicitante", "demanda")
+
+
+def normalize_nome(nome: str) -> str:
+    """Case- and accent-folded lookup key: "  José  da Silva" -> "jose da silva"."""
+    decomposed = unicodedata.normalize("NFKD", nome)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def tokenize(text: str) -> list:
+    """Accent- and case-folded words of ``text``: "Comunicação #2026-001" -> comunicacao, 2026, 001."""
+    return TOKEN_RE.findall(normalize_nome(text or ""))
+
+
+def document_tokens(doc: dict) -> list:
+    """Distinct tokens of a demanda's searchable fields, stored as ``search_tokens``."""
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        tokens.update(tokenize(doc.get(field)))
+    return sorted(tokens)
+
+
+def search_terms(query: str) -> list:
+    """Terms of a search query: tokens, without stopwords unless that leaves nothing."""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    terms = [token for token in tokens if token not in STOPWORDS] or tokens
+    return terms[:MAX_QUERY_TERMS]
+
+
+def search_condition(terms: list) -> dict:
+    """Every term must prefix some token of the demanda.
+
+    Anchored regexes on the multikey ``search_tokens`` index are range scans,
+    so the cost follows the number of matches, not the collection size.
+    """
+    conditions = [{"search_tokens": {"$regex": f"^{re.escape(term)}"}} for term in terms]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def relevance_score(terms: list) -> dict:
+    """Aggregation expression ranking matches: 2 points per term that is a
+    whole word of the demanda, 1 per term that only prefixes one."""
+    return {"$add": [{"$cond": [{"$in": [term, "$search_tokens"]}, 2, 1]} for term in terms]}
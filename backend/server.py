@@ -1,27 +1,144 @@
 import os
-import io
+import json
 import base64
-from datetime import datetime, timezone
+import hashlib
+import time
+import queue
+import shutil
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
 from typing import Optional, List
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from urllib.parse import quote, unquote
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, computed_field
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ReturnDocument, UpdateOne, DeleteOne
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
 from bson import ObjectId
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib import colors
+from storage import BlobStore, BlobTooLarge, CHUNK_SIZE
+from images import build_image_derivatives
+from report import ReportRenderer, ReportCache, ReportTimeout, render_monthly_pdf, get_month_year_pt
+from events import LocalBroker, MongoBroker
+from compression import CompressionMiddleware
+from metrics import MetricsRegistry, MetricsMiddleware, MongoCommandMetrics, PHASE_BUCKETS
+from profiling import ProfilingMiddleware, ProfileStore, SlowLog, MongoCommandTracer
+from search import normalize_nome, document_tokens, search_terms, search_condition, relevance_score
+from export import ZipStream, EXPORT_COLUMNS, export_row, csv_line, archive_name, build_xlsx
 
 load_dotenv()
 
-app = FastAPI(title="Sistema de Demandas - Assessoria de Comunicação")
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_FILE_SIZE = int(os.environ.get("MAX_UPLOAD_FILE_SIZE", 100 * 1024 * 1024))
+MAX_UPLOAD_REQUEST_SIZE = int(os.environ.get("MAX_UPLOAD_REQUEST_SIZE", 250 * 1024 * 1024))
+ATTACHMENT_CACHE_MAX_AGE = int(os.environ.get("ATTACHMENT_CACHE_MAX_AGE", 300))
+SOLICITANTES_CACHE_TTL = float(os.environ.get("SOLICITANTES_CACHE_TTL", 60))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 2))
+REPORT_TIMEOUT = float(os.environ.get("REPORT_TIMEOUT", 120))
+REPORT_JOB_TTL = int(os.environ.get("REPORT_JOB_TTL", 3600))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", str(Path(__file__).parent / "reports"))
+REPORT_BATCH_SIZE = int(os.environ.get("REPORT_BATCH_SIZE", 50))
+NUMERO_BLOCK_SIZE = int(os.environ.get("NUMERO_BLOCK_SIZE", 1))
+TOMBSTONE_TTL = int(os.environ.get("TOMBSTONE_TTL", 30 * 24 * 3600))
+# "local" fans events out within this process only; "mongo" shares them
+# between server processes through a capped collection
+EVENTS_BACKEND = os.environ.get("EVENTS_BACKEND", "local")
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", 100))
+EVENTS_KEEPALIVE = float(os.environ.get("EVENTS_KEEPALIVE", 15))
+# Comma-separated, in order of preference; empty disables compression
+COMPRESSION_ENCODINGS = [e.strip() for e in os.environ.get("COMPRESSION_ENCODINGS", "br,gzip").split(",") if e.strip()]
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+# Per-request cProfile on X-Profile: 1 or ?profile=1; off unless enabled
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", str(Path(__file__).parent / "profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+# Slow log thresholds in milliseconds; 0 disables
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies larger than ``max_size`` while they are received.
+
+    Requests announcing a bigger Content-Length are refused before any byte is
+    read; chunked or lying clients are cut off once the limit is crossed.
+    """
+
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_size:
+            response = JSONResponse(status_code=413, content={"detail": self.error_detail()})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail=self.error_detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def error_detail(self):
+        return f"Envio excede o limite de {self.max_size // (1024 * 1024)} MB por requisição"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await backfill_solicitante_keys()
+    await backfill_embedded_files()
+    await ensure_indexes()
+    await backfill_search_tokens()
+    await backfill_entrega_ids()
+    if not await monthly_stats_collection.count_documents({}, limit=1):
+        await rebuild_month_stats()
+    await event_broker.start()
+    yield
+    await event_broker.stop()
+    report_renderer.shutdown()
+    report_cache.close()
+
+
+app = FastAPI(
+    title="Sistema de Demandas - Assessoria de Comunicação",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+app.add_middleware(RequestSizeLimitMiddleware, max_size=MAX_UPLOAD_REQUEST_SIZE)
+
+if COMPRESSION_ENCODINGS:
+    app.add_middleware(
+        CompressionMiddleware,
+        encodings=COMPRESSION_ENCODINGS,
+        minimum_size=COMPRESSION_MIN_SIZE
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,24 +148,163 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+slow_log = SlowLog(request_ms=SLOW_REQUEST_MS, query_ms=SLOW_QUERY_MS)
+profile_store = ProfileStore(PROFILE_DIR, keep=PROFILE_KEEP) if PROFILING_ENABLED else None
+app.add_middleware(ProfilingMiddleware, slow_log=slow_log, store=profile_store)
+
+# Outermost, so timings and sizes cover every other middleware
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+report_phase_seconds = metrics.histogram(
+    "report_render_phase_seconds", "Monthly PDF rendering time per phase: fetch, images, layout.",
+    ["phase"], buckets=PHASE_BUCKETS
+)
+
 MONGO_URL = os.environ.get("MONGO_URL")
 DB_NAME = os.environ.get("DB_NAME")
 
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[MongoCommandMetrics(metrics), MongoCommandTracer(slow_log)])
 db = client[DB_NAME]
 demandas_collection = db["demandas"]
 solicitantes_collection = db["solicitantes"]
 counters_collection = db["counters"]
+report_jobs_collection = db["report_jobs"]
+tombstones_collection = db["demanda_tombstones"]
+monthly_stats_collection = db["monthly_stats"]
+blob_leases_collection = db["blob_leases"]
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", str(Path(__file__).parent / "uploads"))
+blob_store = BlobStore(UPLOAD_DIR)
+report_renderer = ReportRenderer(max_workers=REPORT_WORKERS, timeout=REPORT_TIMEOUT)
+report_cache = ReportCache(REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_BYTES)
+
+if EVENTS_BACKEND == "mongo":
+    event_broker = MongoBroker(db["events"], queue_size=EVENTS_QUEUE_SIZE)
+else:
+    event_broker = LocalBroker(queue_size=EVENTS_QUEUE_SIZE)
 
 STATUS_OPTIONS = ["Em aberto", "Confirmado", "Em aprovação", "Finalizado"]
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BULK_OPERATIONS = 500
+MAX_WHATSAPP_BATCH = 500
+
+# Delta sync: more changes than this and the client is told to reload instead
+MAX_CHANGES = 500
+# Writes are stamped before they commit; re-send what was stamped this
+# long before the previous sync so a slow write is not missed
+CHANGES_GRACE = timedelta(seconds=5)
+
+# Responses never carry file bodies (legacy documents may still embed them)
+# nor the search index
+LIST_EXCLUDED_FIELDS = ("referencias.file_data", "entregas.file_data", "search_tokens")
+LIST_PROJECTION = {field: 0 for field in LIST_EXCLUDED_FIELDS}
+
+# Just what report_snapshot reads
+REPORT_PROJECTION = {
+    "numero": 1, "solicitante": 1, "demanda": 1, "status": 1,
+    "referencias.type": 1, "referencias.url": 1, "referencias.filename": 1,
+    "entregas.type": 1, "entregas.url": 1, "entregas.filename": 1, "entregas.mime_type": 1,
+    "entregas.file_id": 1, "entregas.derivatives.report": 1,
+}
+
+# Just what whatsapp_text reads
+WHATSAPP_PROJECTION = {
+    "numero": 1, "solicitante": 1, "demanda": 1, "status": 1,
+    "entregas.type": 1, "entregas.url": 1, "entregas.filename": 1,
+}
+
+# Just what export_row and the ZIP archive read
+EXPORT_PROJECTION = {
+    "numero": 1, "solicitante": 1, "demanda": 1, "status": 1, "created_at": 1,
+    "referencias.type": 1, "referencias.url": 1, "referencias.filename": 1,
+    "referencias.file_id": 1, "referencias.mime_type": 1,
+    "entregas.type": 1, "entregas.url": 1, "entregas.filename": 1,
+    "entregas.file_id": 1, "entregas.mime_type": 1,
+}
+
+# Indexes backing the query patterns below; reconciled on every startup
+INDEXES = {
+    "demandas": [
+        # month filter (list and PDF report) sorted by creation
+        IndexModel([("month_year", 1), ("created_at", 1), ("_id", 1)], name="month_year_created_at"),
+        # status filter sorted by creation
+        IndexModel([("status", 1), ("created_at", 1), ("_id", 1)], name="status_created_at"),
+        # unfiltered list and keyset pagination
+        IndexModel([("created_at", 1), ("_id", 1)], name="created_at"),
+        # blob reference checks before deleting a file
+        IndexModel([("referencias.file_id", 1)], name="referencias_file_id", sparse=True),
+        IndexModel([("entregas.file_id", 1)], name="entregas_file_id", sparse=True),
+        # delta sync
+        IndexModel([("updated_seq", 1)], name="updated_seq", sparse=True),
+        IndexModel([("updated_at", 1)], name="updated_at", sparse=True),
+        # search: prefix matches on folded words
+        IndexModel([("search_tokens", 1)], name="search_tokens"),
+    ],
+    "demanda_tombstones": [
+        IndexModel([("updated_seq", 1)], name="updated_seq"),
+        IndexModel([("updated_at", 1)], name="updated_at_ttl", expireAfterSeconds=TOMBSTONE_TTL),
+    ],
+    "solicitantes": [
+        IndexModel([("nome_key", 1)], name="nome_key_unique", unique=True),
+    ],
+    "report_jobs": [
+        # at most one queued/running job per month
+        IndexModel([("month_year", 1)], name="active_month_year", unique=True,
+                   partialFilterExpression={"active": True}),
+        IndexModel([("finished_at", 1)], name="finished_at"),
+    ],
+    "monthly_stats": [
+        IndexModel([("sort_key", 1)], name="sort_key"),
+    ],
+    "blob_leases": [
+        # leases of crashed processes
+        IndexModel([("expires_at", 1)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Indexes from earlier releases that are dropped if still present
+RETIRED_INDEXES = {
+    "solicitantes": ["nome_unique"],
+}
+
 
 class DeliveryItem(BaseModel):
+    id: Optional[str] = None  # stable entrega id
     type: str  # "file" or "link"
     url: Optional[str] = None
     filename: Optional[str] = None
-    file_data: Optional[str] = None  # base64 for files
     mime_type: Optional[str] = None
+    file_id: Optional[str] = None  # blob store key for files
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    width: Optional[int] = None  # images only
+    height: Optional[int] = None
+    derivatives: Optional[dict] = None  # "report"/"thumb" blobs of images
+    added_at: Optional[str] = None  # entregas only
+
+
+class BulkOperation(BaseModel):
+    op: str  # "status", "update" or "delete"
+    id: str
+    status: Optional[str] = None
+    solicitante: Optional[str] = None
+    demanda: Optional[str] = None
+
+
+class BulkRequest(BaseModel):
+    operations: List[BulkOperation]
+    ordered: bool = True
+
+
+class WhatsappBatchRequest(BaseModel):
+    ids: Optional[List[str]] = None  # or filter by month/year and status
+    month: Optional[str] = None
+    year: Optional[str] = None
+    status: Optional[str] = None
+    digest: bool = False  # also join the messages into one text
 
 
 class DemandaResponse(BaseModel):
@@ -56,28 +312,273 @@ class DemandaResponse(BaseModel):
     numero: str
     solicitante: str
     demanda: str
-    referencias: Optional[List[dict]] = None
+    referencias: Optional[List[DeliveryItem]] = None
     status: str
-    entregas: Optional[List[dict]] = None
+    entregas: Optional[List[DeliveryItem]] = None
     created_at: str
     month_year: str
 
 
+class DemandaListItem(DemandaResponse):
+    @computed_field
+    @property
+    def referencias_count(self) -> int:
+        return len(self.referencias or [])
+
+    @computed_field
+    @property
+    def entregas_count(self) -> int:
+        return len(self.entregas or [])
+
+
+class DemandaPage(BaseModel):
+    items: List[DemandaListItem]
+    next_cursor: Optional[str] = None
+    sync_token: str
+
+
+class DemandaChanges(BaseModel):
+    items: List[DemandaListItem]
+    removed: List[str]
+    reset: bool
+    sync_token: str
+
+
+def demanda_model(doc: dict, model=DemandaResponse):
+    """Build a response model straight from a demanda document.
+
+    Storage-only fields (legacy file_data, change stamps...) are dropped.
+    """
+    return model.model_validate({**doc, "id": str(doc["_id"])})
+
+
+def model_response(content: BaseModel, **kwargs) -> ORJSONResponse:
+    """Serialize a response model with orjson, bypassing FastAPI's re-validation.
+
+    Fields absent from the document stay absent from the JSON.
+    """
+    return ORJSONResponse(content.model_dump(exclude_unset=True), **kwargs)
+
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
-async def get_next_demanda_number():
-    year = datetime.now().year
-    counter = await counters_collection.find_one_and_update(
-        {"_id": f"demanda_{year}"},
+class NumeroAllocator:
+    """Hands out "#YYYY-NNN" numbers from ranges reserved on the year's counter.
+
+    Requests arriving while a reservation is in flight are served by the
+    same $inc, so a burst of creations costs one counter update. With
+    ``block_size`` > 1 spare numbers are also kept for later requests; those
+    left unused when the process stops or the year rolls over are skipped.
+    """
+
+    def __init__(self, block_size: int = 1):
+        self.block_size = block_size
+        self._year = None
+        self._next = 0
+        self._end = 0
+        self._waiting = 0
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> str:
+        year = datetime.now().year
+        self._waiting += 1
+        try:
+            async with self._lock:
+                if self._year != year or self._next >= self._end:
+                    count = max(self.block_size, self._waiting)
+                    counter = await counters_collection.find_one_and_update(
+                        {"_id": f"demanda_{year}"},
+                        {"$inc": {"seq": count}},
+                        upsert=True,
+                        return_document=ReturnDocument.AFTER
+                    )
+                    self._year = year
+                    self._end = counter["seq"] + 1
+                    self._next = self._end - count
+                seq = self._next
+                self._next += 1
+        finally:
+            self._waiting -= 1
+        return f"#{year}-{seq:03d}"
+
+
+numero_allocator = NumeroAllocator(block_size=NUMERO_BLOCK_SIZE)
+
+
+async def touch_month(month_year: str):
+    """Bump the content version of a month so cached reports are re-rendered."""
+    await counters_collection.update_one(
+        {"_id": f"month_version_{month_year}"},
         {"$inc": {"seq": 1}},
+        upsert=True
+    )
+
+
+async def get_month_version(month_year: str) -> int:
+    counter = await counters_collection.find_one({"_id": f"month_version_{month_year}"})
+    return counter["seq"] if counter else 0
+
+
+# ============ MONTHLY STATS ============
+
+def stats_key(nome: str) -> str:
+    # Names become field names in by_solicitante; "." and "$" are not allowed there
+    return nome.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def month_sort_key(month_year: str) -> str:
+    month, year = month_year.split("/")
+    return f"{year}-{month}"
+
+
+def month_stats_delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """$inc moving a demanda's contribution to its month from ``before`` to ``after``."""
+    inc = {}
+    for doc, sign in ((before, -1), (after, 1)):
+        if doc is None:
+            continue
+        for field in ("total", f"by_status.{doc['status']}", f"by_solicitante.{stats_key(doc['solicitante'])}"):
+            inc[field] = inc.get(field, 0) + sign
+    return {field: value for field, value in inc.items() if value}
+
+
+async def update_month_stats(month_year: str, before: Optional[dict], after: Optional[dict]):
+    """Apply a demanda's change to the month's counters.
+
+    ``before`` and ``after`` are the status/solicitante of the demanda as
+    returned by the atomic write itself, so concurrent writes never race on
+    the counters. None stands for a demanda that does not exist (yet).
+    """
+    await apply_month_stats(month_year, month_stats_delta(before, after))
+
+
+async def apply_month_stats(month_year: str, inc: dict):
+    if inc:
+        await monthly_stats_collection.update_one(
+            {"_id": month_year},
+            {"$inc": inc, "$setOnInsert": {"sort_key": month_sort_key(month_year)}},
+            upsert=True
+        )
+
+
+async def rebuild_month_stats():
+    """Recompute monthly_stats from the demandas collection.
+
+    Meant for startup and maintenance: writes made while it runs may be lost.
+    """
+    pipeline = [{"$group": {
+        "_id": {"month_year": "$month_year", "status": "$status", "solicitante": "$solicitante"},
+        "count": {"$sum": 1}
+    }}]
+    stats = {}
+    async for row in demandas_collection.aggregate(pipeline):
+        month_year = row["_id"].get("month_year")
+        if not month_year:
+            continue
+        month = stats.setdefault(month_year, {
+            "_id": month_year, "sort_key": month_sort_key(month_year),
+            "total": 0, "by_status": {}, "by_solicitante": {}
+        })
+        status = row["_id"]["status"]
+        solicitante = stats_key(row["_id"]["solicitante"])
+        month["total"] += row["count"]
+        month["by_status"][status] = month["by_status"].get(status, 0) + row["count"]
+        month["by_solicitante"][solicitante] = month["by_solicitante"].get(solicitante, 0) + row["count"]
+
+    await monthly_stats_collection.delete_many({"_id": {"$nin": list(stats)}})
+    for month in stats.values():
+        await monthly_stats_collection.replace_one({"_id": month["_id"]}, month, upsert=True)
+    logger.info("Rebuilt monthly stats for %d month(s)", len(stats))
+
+
+async def get_month_stats(month_year: str) -> dict:
+    doc = await monthly_stats_collection.find_one({"_id": month_year}) or {}
+    by_status = {status: 0 for status in STATUS_OPTIONS}
+    by_status.update({status: count for status, count in (doc.get("by_status") or {}).items() if count})
+    return {
+        "month_year": month_year,
+        "total": doc.get("total", 0),
+        "by_status": by_status,
+        "by_solicitante": {
+            unquote(key): count for key, count in (doc.get("by_solicitante") or {}).items() if count
+        }
+    }
+
+
+# ============ CHANGE TRACKING ============
+
+async def next_changes(count: int = 1) -> List[dict]:
+    """Allocate ``count`` change stamps ({"updated_seq", "updated_at"}) for writes."""
+    now = datetime.now(timezone.utc)
+    counter = await counters_collection.find_one_and_update(
+        {"_id": "demanda_changes"},
+        {"$inc": {"seq": count}, "$max": {"updated_at": now}},
         upsert=True,
-        return_document=True
+        return_document=ReturnDocument.AFTER
     )
-    seq = counter["seq"]
-    return f"#{year}-{seq:03d}"
+    first = counter["seq"] - count + 1
+    return [{"updated_seq": seq, "updated_at": now} for seq in range(first, counter["seq"] + 1)]
+
+
+async def next_change() -> dict:
+    return (await next_changes())[0]
+
+
+async def add_tombstones(ids: List[ObjectId], changes: List[dict]):
+    """Record deletions for delta sync; they expire after TOMBSTONE_TTL."""
+    for object_id, change in zip(ids, changes):
+        await tombstones_collection.replace_one({"_id": object_id}, {"_id": object_id, **change}, upsert=True)
+
+
+async def get_change_version():
+    """Latest change seq, and whether every write stamped so far has settled.
+
+    Writes are stamped before they commit, so within CHANGES_GRACE of the
+    latest stamp the collection may still change under the same seq.
+    """
+    counter = await counters_collection.find_one({"_id": "demanda_changes"}) or {}
+    stamped_at = counter.get("updated_at")
+    if stamped_at is not None and stamped_at.tzinfo is None:
+        stamped_at = stamped_at.replace(tzinfo=timezone.utc)
+    settled = stamped_at is None or stamped_at < datetime.now(timezone.utc) - CHANGES_GRACE
+    return counter.get("seq", 0), settled
+
+
+async def get_sync_token() -> str:
+    """Token for the changes made after this point."""
+    seq, _ = await get_change_version()
+    return encode_sync_token(seq, datetime.now(timezone.utc))
+
+
+def encode_sync_token(seq: int, at: datetime) -> str:
+    payload = json.dumps([seq, at.isoformat()])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_sync_token(token: str):
+    try:
+        seq, at = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return int(seq), datetime.fromisoformat(at)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Token de sincronização inválido")
+
+
+async def publish_change(change_type: str, doc: dict, fields=()):
+    """Broadcast a compact change event to the dashboards listening on /api/events.
+
+    ``doc`` is the demanda after the change (before it, for deletions).
+    """
+    event = {"type": change_type, "id": str(doc["_id"]), "numero": doc.get("numero"), "fields": list(fields)}
+    if "status" in fields:
+        event["status"] = doc["status"]
+    try:
+        await event_broker.publish(event)
+    except Exception:
+        # Clients resync on their next change or reconnect; the write stands
+        logger.exception("Could not publish change event")
 
 
 def get_month_year_key(date: datetime = None):
@@ -86,38 +587,368 @@ def get_month_year_key(date: datetime = None):
     return f"{date.month:02d}/{date.year}"
 
 
-def get_month_year_pt(month_year: str):
-    months = {
-        '01': 'Janeiro', '02': 'Fevereiro', '03': 'Março', '04': 'Abril',
-        '05': 'Maio', '06': 'Junho', '07': 'Julho', '08': 'Agosto',
-        '09': 'Setembro', '10': 'Outubro', '11': 'Novembro', '12': 'Dezembro'
+# ============ INDEXES ============
+
+def index_matches(existing: dict, model: IndexModel) -> bool:
+    spec = model.document
+    if list(existing["key"]) != list(spec["key"].items()):
+        return False
+    for option in ("unique", "sparse"):
+        if bool(existing.get(option)) != bool(spec.get(option)):
+            return False
+    if existing.get("expireAfterSeconds") != spec.get("expireAfterSeconds"):
+        return False
+    if dict(existing.get("partialFilterExpression") or {}) != dict(spec.get("partialFilterExpression") or {}):
+        return False
+    # The server fills in every collation option, so only the declared ones
+    # are compared, but an index must have a collation exactly when declared
+    existing_collation = existing.get("collation") or {}
+    declared_collation = spec.get("collation") or {}
+    if bool(existing_collation) != bool(declared_collation):
+        return False
+    return all(existing_collation.get(k) == v for k, v in declared_collation.items())
+
+
+async def ensure_indexes():
+    """Create missing indexes and rebuild the ones whose definition changed."""
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                logger.info("Dropping retired index %s.%s", collection_name, name)
+                await db[collection_name].drop_index(name)
+
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        for model in models:
+            name = model.document["name"]
+            current = existing.get(name)
+            if current is not None:
+                if index_matches(current, model):
+                    continue
+                logger.info("Rebuilding index %s.%s", collection.name, name)
+                await collection.drop_index(name)
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as exc:
+                # e.g. duplicated names predating the unique index; keep serving
+                logger.warning("Could not create index %s.%s: %s", collection.name, name, exc)
+
+
+@app.get("/api/admin/indexes")
+async def get_index_stats():
+    """Report index definitions and usage counters from $indexStats"""
+    report = []
+    for collection_name in INDEXES:
+        async for stat in db[collection_name].aggregate([{"$indexStats": {}}]):
+            report.append({
+                "collection": collection_name,
+                "name": stat["name"],
+                "key": stat["key"],
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"].isoformat()
+            })
+    return report
+
+
+# ============ ATTACHMENTS ============
+
+# Blobs are shared by every demanda holding the same content, so a write
+# adding a reference and a release deleting the last one must not overlap:
+# writers hold a lease on the blob from storing it until the reference is
+# written, and a release locks it exclusively while it checks and deletes.
+BLOB_LEASE = timedelta(minutes=10)
+
+
+async def lease_blob(file_id: str):
+    """Keep ``file_id`` from being deleted until ``release_blob_leases``.
+
+    Waits for a deletion in progress to finish; the caller must then make
+    sure the blob still exists.
+    """
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            await blob_leases_collection.update_one(
+                {"_id": file_id, "$or": [{"deleting": False}, {"expires_at": {"$lt": now}}]},
+                {"$inc": {"holders": 1}, "$set": {"deleting": False, "expires_at": now + BLOB_LEASE}},
+                upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            await asyncio.sleep(0.05)
+
+
+async def release_blob_leases(file_ids: List[str]):
+    for file_id in file_ids:
+        await blob_leases_collection.update_one({"_id": file_id, "deleting": False}, {"$inc": {"holders": -1}})
+        await blob_leases_collection.delete_one({"_id": file_id, "deleting": False, "holders": {"$lte": 0}})
+
+
+async def lock_blob_for_deletion(file_id: str) -> bool:
+    """Take the blob's lease exclusively; False while writers hold it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await blob_leases_collection.update_one(
+            {"_id": file_id, "expires_at": {"$lt": now}},
+            {"$set": {"deleting": True, "holders": 0, "expires_at": now + BLOB_LEASE}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def store_upload(file: UploadFile) -> dict:
+    """Stream an uploaded file into the blob store and return its reference.
+
+    The blob is leased; release it once the reference is written.
+    """
+    async def put():
+        await file.seek(0)
+        try:
+            return await run_in_threadpool(blob_store.put_stream, file.file, MAX_UPLOAD_FILE_SIZE)
+        except BlobTooLarge:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo {file.filename} excede o limite de {MAX_UPLOAD_FILE_SIZE // (1024 * 1024)} MB"
+            )
+
+    stored = await put()
+    await lease_blob(stored["file_id"])
+    if not blob_store.exists(stored["file_id"]):
+        # An identical blob was being released while this one was stored
+        stored = await put()
+    item = {
+        "type": "file",
+        "filename": file.filename,
+        "mime_type": file.content_type,
+        **stored
     }
+    # Decode images once here so reports and previews use small derivatives
+    if (file.content_type or "").startswith("image/"):
+        image_meta = await run_in_threadpool(build_image_derivatives, blob_store, stored["file_id"])
+        item.update(image_meta or {"derivatives": None})
+    return item
+
+
+async def store_uploads(files: List[UploadFile]) -> List[dict]:
+    """Store every named upload; on failure, drop the blobs already written."""
+    stored = []
+    try:
+        for file in files:
+            if file.filename:
+                stored.append(await store_upload(file))
+    except Exception:
+        await release_blob_leases([item["file_id"] for item in stored])
+        await release_attachments(stored)
+        raise
+    return stored
+
+
+# Attachment lists of a demanda
+ATTACHMENT_FIELDS = ("referencias", "entregas")
+
+
+def extract_embedded(items):
+    """Move the base64 ``file_data`` of attachments into the blob store.
+
+    Returns the rewritten items and how many files were moved.
+    """
+    moved = 0
+    migrated = []
+    for item in items or []:
+        if item.get("type") == "file" and item.get("file_data"):
+            item = dict(item)
+            data = base64.b64decode(item.pop("file_data"))
+            item.update(blob_store.put_bytes(data))
+            moved += 1
+        migrated.append(item)
+    return migrated, moved
+
+
+async def backfill_embedded_files() -> int:
+    """Move file bodies embedded by earlier releases into the blob store.
+
+    Readers only look at ``file_id``, so this runs before the app serves.
+    """
+    query = {"$or": [{f"{field}.file_data": {"$exists": True}} for field in ATTACHMENT_FIELDS]}
+    projection = {"updated_seq": 1, **{field: 1 for field in ATTACHMENT_FIELDS}}
+    files = 0
+    async for doc in demandas_collection.find(query, projection, batch_size=20):
+        update = {}
+        moved = 0
+        leased = []
+        for field in ATTACHMENT_FIELDS:
+            migrated, count = await run_in_threadpool(extract_embedded, doc.get(field))
+            if count:
+                update[field] = migrated
+                moved += count
+                leased += [new["file_id"] for new, old in zip(migrated, doc[field]) if old.get("file_data")]
+        for file_id in leased:
+            await lease_blob(file_id)
+        try:
+            if not all(blob_store.exists(file_id) for file_id in leased):
+                # An identical blob was being released meanwhile; store them again
+                for field in update:
+                    await run_in_threadpool(extract_embedded, doc.get(field))
+            # Conditioned on the change stamp read, so a concurrent write is not undone;
+            # the document is retried on the next start
+            result = await demandas_collection.update_one(
+                {"_id": doc["_id"], "updated_seq": doc.get("updated_seq")}, {"$set": update}
+            )
+        finally:
+            await release_blob_leases(leased)
+        if result.modified_count:
+            files += moved
+    if files:
+        logger.info("Moved %d embedded file(s) to the blob store", files)
+    return files
+
+
+async def release_attachments(*attachment_lists):
+    """Delete the blobs of file attachments no longer referenced by any demanda.
+
+    Derivatives are a function of their original, so they go with it.
+    """
+    for items in attachment_lists:
+        for item in items or []:
+            file_id = item.get("file_id")
+            if item.get("type") != "file" or not file_id:
+                continue
+            if not await lock_blob_for_deletion(file_id):
+                continue  # about to be referenced again
+            try:
+                in_use = await demandas_collection.count_documents(
+                    {"$or": [{"referencias.file_id": file_id}, {"entregas.file_id": file_id}]},
+                    limit=1
+                )
+                if not in_use:
+                    blob_ids = [file_id] + [d["file_id"] for d in (item.get("derivatives") or {}).values()]
+                    for blob_id in blob_ids:
+                        await run_in_threadpool(blob_store.delete, blob_id)
+            finally:
+                await blob_leases_collection.delete_one({"_id": file_id, "deleting": True})
+
+
+def encode_cursor(doc: dict) -> str:
+    position = [doc["created_at"], str(doc["_id"])]
+    if "_score" in doc:
+        position.append(doc["_score"])
+    payload = json.dumps(position)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, ranked: bool = False):
+    """(created_at, _id) of the last item seen, plus its score for ranked searches."""
     try:
-        parts = month_year.split('/')
-        return f"{months[parts[0]]} de {parts[1]}"
-    except:
-        return month_year
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if len(position) != (3 if ranked else 2):
+            raise ValueError("cursor from another listing")
+        return (position[0], ObjectId(position[1]), *position[2:])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
 
 
 # ============ SOLICITANTES ============
 
+class SolicitanteDirectory:
+    """In-process cache of the solicitantes collection.
+
+    The whole directory is small, so it is loaded at once and served from
+    memory. Local inserts invalidate it immediately; the TTL bounds how long
+    inserts made by other workers can go unseen.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = None
+        self._by_key = {}
+        self._loaded_at = 0.0
+        self.digest = None  # content hash of the loaded entries
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._entries = None
+
+    async def _load(self):
+        if self._entries is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._entries is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            entries = []
+            async for doc in solicitantes_collection.find({}, {"nome": 1, "nome_key": 1}):
+                entries.append({
+                    "id": str(doc["_id"]),
+                    "nome": doc["nome"],
+                    "nome_key": doc.get("nome_key") or normalize_nome(doc["nome"])
+                })
+            entries.sort(key=lambda entry: entry["nome_key"])
+            self._by_key = {entry["nome_key"]: entry for entry in entries}
+            self._entries = entries
+            self.digest = hashlib.sha1(
+                json.dumps([(entry["id"], entry["nome"]) for entry in entries]).encode("utf-8")
+            ).hexdigest()
+            self._loaded_at = time.monotonic()
+
+    async def all(self) -> List[dict]:
+        await self._load()
+        return [{"id": entry["id"], "nome": entry["nome"]} for entry in self._entries]
+
+    async def resolve(self, nome: str) -> dict:
+        """Return the solicitante matching ``nome``, creating it if needed."""
+        nome = " ".join(nome.split())
+        key = normalize_nome(nome)
+        await self._load()
+        entry = self._by_key.get(key)
+        if entry:
+            return {"id": entry["id"], "nome": entry["nome"]}
+
+        try:
+            doc = await solicitantes_collection.find_one_and_update(
+                {"nome_key": key},
+                {"$setOnInsert": {"nome": nome, "nome_key": key}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with another request; the winner's row is there now
+            doc = await solicitantes_collection.find_one({"nome_key": key})
+        self.invalidate()
+        return {"id": str(doc["_id"]), "nome": doc["nome"]}
+
+
+solicitantes_directory = SolicitanteDirectory(SOLICITANTES_CACHE_TTL)
+
+
+async def backfill_solicitante_keys():
+    """Add nome_key to solicitantes created before it existed, merging duplicates."""
+    seen = set()
+    async for doc in solicitantes_collection.find({"nome_key": {"$exists": False}}, {"nome": 1}):
+        key = normalize_nome(doc["nome"])
+        duplicate = key in seen or await solicitantes_collection.count_documents({"nome_key": key}, limit=1)
+        if duplicate:
+            await solicitantes_collection.delete_one({"_id": doc["_id"]})
+        else:
+            await solicitantes_collection.update_one({"_id": doc["_id"]}, {"$set": {"nome_key": key}})
+        seen.add(key)
+
+
 @app.get("/api/solicitantes")
-async def get_solicitantes():
-    cursor = solicitantes_collection.find().sort("nome", 1)
-    solicitantes = []
-    async for doc in cursor:
-        solicitantes.append({"id": str(doc["_id"]), "nome": doc["nome"]})
-    return solicitantes
+async def get_solicitantes(request: Request):
+    solicitantes = await solicitantes_directory.all()
+    etag = weak_etag("solicitantes", solicitantes_directory.digest)
+    headers = validator_headers(etag)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(solicitantes, headers=headers)
 
 
 @app.post("/api/solicitantes")
 async def add_solicitante(nome: str = Form(...)):
-    existing = await solicitantes_collection.find_one({"nome": {"$regex": f"^{nome}$", "$options": "i"}})
-    if existing:
-        return {"id": str(existing["_id"]), "nome": existing["nome"]}
-    
-    result = await solicitantes_collection.insert_one({"nome": nome})
-    return {"id": str(result.inserted_id), "nome": nome}
+    return await solicitantes_directory.resolve(nome)
 
 
 # ============ DEMANDAS ============
@@ -129,15 +960,6 @@ async def create_demanda(
     referencia_links: Optional[str] = Form(None),
     referencia_files: List[UploadFile] = File(default=[])
 ):
-    # Ensure solicitante exists
-    existing = await solicitantes_collection.find_one({"nome": {"$regex": f"^{solicitante}$", "$options": "i"}})
-    if not existing:
-        await solicitantes_collection.insert_one({"nome": solicitante})
-    
-    numero = await get_next_demanda_number()
-    now = datetime.now(timezone.utc)
-    month_year = get_month_year_key(now)
-    
     referencias = []
     
     # Process links
@@ -147,18 +969,23 @@ async def create_demanda(
             if link:
                 referencias.append({"type": "link", "url": link})
     
-    # Process files
-    for file in referencia_files:
-        if file.filename:
-            contents = await file.read()
-            referencias.append({
-                "type": "file",
-                "filename": file.filename,
-                "mime_type": file.content_type,
-                "file_data": base64.b64encode(contents).decode("utf-8")
-            })
+    # Process files first so an oversized upload does not consume a number
+    stored = await store_uploads(referencia_files)
+    referencias.extend(stored)
+    
+    # Ensure solicitante exists, reusing the spelling already on file; the
+    # lookups are independent, so they run concurrently
+    solicitante_doc, numero, change = await asyncio.gather(
+        solicitantes_directory.resolve(solicitante),
+        numero_allocator.next(),
+        next_change()
+    )
+    solicitante = solicitante_doc["nome"]
+    now = datetime.now(timezone.utc)
+    month_year = get_month_year_key(now)
     
     demanda_doc = {
+        **change,
         "numero": numero,
         "solicitante": solicitante,
         "demanda": demanda,
@@ -168,31 +995,60 @@ async def create_demanda(
         "created_at": now.isoformat(),
         "month_year": month_year
     }
+    demanda_doc["search_tokens"] = document_tokens(demanda_doc)
     
-    result = await demandas_collection.insert_one(demanda_doc)
-    
-    return DemandaResponse(
-        id=str(result.inserted_id),
-        numero=numero,
-        solicitante=solicitante,
-        demanda=demanda,
-        referencias=referencias if referencias else None,
-        status="Em aberto",
-        entregas=None,
-        created_at=demanda_doc["created_at"],
-        month_year=month_year
+    try:
+        await demandas_collection.insert_one(demanda_doc)
+    finally:
+        await release_blob_leases([item["file_id"] for item in stored])
+    # The month version is bumped after its counters are written: stats
+    # ETags and cached reports taken at the new version must see them
+    await update_month_stats(month_year, None, demanda_doc)
+    await asyncio.gather(
+        touch_month(month_year),
+        publish_change("created", demanda_doc, ["numero", "solicitante", "demanda", "status", "referencias"])
     )
+    
+    return model_response(demanda_model(demanda_doc))
 
 
-@app.get("/api/demandas")
-async def get_demandas(
-    month: Optional[str] = None,
-    year: Optional[str] = None,
-    status: Optional[str] = None,
-    solicitante: Optional[str] = None,
-    search: Optional[str] = None
-):
-    query = {}
+async def backfill_search_tokens(rebuild: bool = False) -> int:
+    """Index demandas stored before search_tokens existed (all of them with ``rebuild``)."""
+    query = {} if rebuild else {"search_tokens": {"$exists": False}}
+    projection = {field: 1 for field in ("numero", "solicitante", "demanda")}
+    updates = []
+    count = 0
+    async for doc in demandas_collection.find(query, projection, batch_size=500):
+        # Conditioned on the fields read, so a concurrent edit keeps its own tokens
+        updates.append(UpdateOne(
+            {"_id": doc["_id"], "solicitante": doc.get("solicitante"), "demanda": doc.get("demanda")},
+            {"$set": {"search_tokens": document_tokens(doc)}}
+        ))
+        if len(updates) == 500:
+            count += (await demandas_collection.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+    if updates:
+        count += (await demandas_collection.bulk_write(updates, ordered=False)).modified_count
+    return count
+
+
+async def backfill_entrega_ids() -> int:
+    """Give entregas stored before they had ids one, so they can be removed."""
+    query = {"entregas": {"$elemMatch": {"id": {"$exists": False}}}}
+    assigned = 0
+    async for doc in demandas_collection.find(query, {"entregas.id": 1}, batch_size=100):
+        # One element per update, so entregas pushed meanwhile are left alone
+        for _ in range(sum(1 for item in doc["entregas"] if "id" not in item)):
+            result = await demandas_collection.update_one(
+                {"_id": doc["_id"], **query},
+                {"$set": {"entregas.$.id": str(ObjectId())}}
+            )
+            assigned += result.modified_count
+    return assigned
+
+
+def demandas_conditions(month, year, status, solicitante, search) -> List[dict]:
+    """Query conditions for the list filters shared by the list and changes endpoints."""
     conditions = []
     
     if month and year:
@@ -205,58 +1061,160 @@ async def get_demandas(
     if solicitante:
         conditions.append({"solicitante": {"$regex": solicitante, "$options": "i"}})
     
-    if search:
-        conditions.append({
+    terms = search_terms(search) if search else []
+    if terms:
+        conditions.append(search_condition(terms))
+    
+    return conditions
+
+
+def and_query(conditions: List[dict]) -> dict:
+    if not conditions:
+        return {}
+    return {"$and": conditions} if len(conditions) > 1 else conditions[0]
+
+
+async def search_demandas(conditions: List[dict], terms: List[str], limit: int, cursor: Optional[str]) -> List[dict]:
+    """Up to ``limit + 1`` matches ranked by relevance, newest first among equals."""
+    pipeline = [
+        {"$match": and_query(conditions)},
+        {"$addFields": {"_score": relevance_score(terms)}},
+    ]
+    if cursor:
+        created_at, last_id, score = decode_cursor(cursor, ranked=True)
+        pipeline.append({"$match": {
             "$or": [
-                {"numero": {"$regex": search, "$options": "i"}},
-                {"demanda": {"$regex": search, "$options": "i"}},
-                {"solicitante": {"$regex": search, "$options": "i"}}
+                {"_score": {"$lt": score}},
+                {"_score": score, "created_at": {"$lt": created_at}},
+                {"_score": score, "created_at": created_at, "_id": {"$lt": last_id}}
             ]
-        })
+        }})
+    pipeline += [
+        {"$sort": {"_score": -1, "created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {field: 0 for field in LIST_EXCLUDED_FIELDS}},
+    ]
+    return await demandas_collection.aggregate(pipeline).to_list(length=limit + 1)
+
+
+@app.get("/api/demandas", response_model=DemandaPage)
+async def get_demandas(
+    month: Optional[str] = None,
+    year: Optional[str] = None,
+    status: Optional[str] = None,
+    solicitante: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    request: Request = None
+):
+    # Any write bumps the change seq, so it versions every filtered page
+    seq, settled = await get_change_version()
+    etag = weak_etag("demandas", seq, month, year, status, solicitante, search, limit, cursor) if settled else None
+    headers = validator_headers(etag)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
     
-    if conditions:
-        query = {"$and": conditions} if len(conditions) > 1 else conditions[0]
-    
-    cursor = demandas_collection.find(query).sort("created_at", -1)
-    demandas = []
-    
-    async for doc in cursor:
-        demandas.append({
-            "id": str(doc["_id"]),
-            "numero": doc["numero"],
-            "solicitante": doc["solicitante"],
-            "demanda": doc["demanda"],
-            "referencias": doc.get("referencias"),
-            "status": doc["status"],
-            "entregas": doc.get("entregas"),
-            "created_at": doc["created_at"],
-            "month_year": doc["month_year"]
-        })
+    conditions = demandas_conditions(month, year, status, solicitante, search)
+    terms = search_terms(search) if search else []
+    
+    # Taken before reading, so changes racing with this read are synced later
+    sync_token = encode_sync_token(seq, datetime.now(timezone.utc))
     
-    return demandas
+    if terms:
+        docs = await search_demandas(conditions, terms, limit, cursor)
+    else:
+        # Keyset pagination: continue strictly after the last (created_at, _id) seen
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            conditions.append({
+                "$or": [
+                    {"created_at": {"$lt": created_at}},
+                    {"created_at": created_at, "_id": {"$lt": last_id}}
+                ]
+            })
+        
+        db_cursor = demandas_collection.find(and_query(conditions), LIST_PROJECTION).sort(
+            [("created_at", -1), ("_id", -1)]
+        ).limit(limit + 1)
+        docs = await db_cursor.to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    
+    return model_response(DemandaPage(
+        items=[demanda_model(doc, DemandaListItem) for doc in docs],
+        next_cursor=next_cursor,
+        sync_token=sync_token
+    ), headers=headers)
 
 
-@app.get("/api/demandas/{demanda_id}")
+@app.get("/api/demandas/changes", response_model=DemandaChanges)
+async def get_demanda_changes(
+    since: str,
+    month: Optional[str] = None,
+    year: Optional[str] = None,
+    status: Optional[str] = None,
+    solicitante: Optional[str] = None,
+    search: Optional[str] = None
+):
+    """Demandas created, modified or deleted after ``since``.
+
+    ``items`` are the changed demandas matching the filters; ``removed``
+    holds the ids of deleted demandas and of changed ones that no longer
+    match. Items may repeat across syncs. ``reset`` asks the client to
+    reload the list instead, when there are too many changes or deletions
+    older than TOMBSTONE_TTL could have been missed.
+    """
+    since_seq, since_at = decode_sync_token(since)
+    sync_token = await get_sync_token()
+    
+    reset = model_response(DemandaChanges(items=[], removed=[], reset=True, sync_token=sync_token))
+    if since_at < datetime.now(timezone.utc) - timedelta(seconds=TOMBSTONE_TTL):
+        return reset
+    
+    changed = {"$or": [
+        {"updated_seq": {"$gt": since_seq}},
+        {"updated_at": {"$gte": since_at - CHANGES_GRACE}}
+    ]}
+    filters = and_query(demandas_conditions(month, year, status, solicitante, search))
+    
+    matching_query = {"$and": [changed, filters]} if filters else changed
+    docs = await demandas_collection.find(matching_query, LIST_PROJECTION).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).to_list(length=MAX_CHANGES + 1)
+    
+    removed = []
+    if filters:
+        cursor = demandas_collection.find({"$and": [changed, {"$nor": [filters]}]}, {"_id": 1})
+        removed.extend([str(doc["_id"]) for doc in await cursor.to_list(length=MAX_CHANGES + 1)])
+    cursor = tombstones_collection.find(changed, {"_id": 1})
+    removed.extend([str(doc["_id"]) for doc in await cursor.to_list(length=MAX_CHANGES + 1)])
+    
+    if len(docs) + len(removed) > MAX_CHANGES:
+        return reset
+    
+    return model_response(DemandaChanges(
+        items=[demanda_model(doc, DemandaListItem) for doc in docs],
+        removed=removed,
+        reset=False,
+        sync_token=sync_token
+    ))
+
+
+@app.get("/api/demandas/{demanda_id}", response_model=DemandaResponse)
 async def get_demanda(demanda_id: str):
     try:
-        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)})
+        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)}, LIST_PROJECTION)
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
     if not doc:
         raise HTTPException(status_code=404, detail="Demanda não encontrada")
     
-    return {
-        "id": str(doc["_id"]),
-        "numero": doc["numero"],
-        "solicitante": doc["solicitante"],
-        "demanda": doc["demanda"],
-        "referencias": doc.get("referencias"),
-        "status": doc["status"],
-        "entregas": doc.get("entregas"),
-        "created_at": doc["created_at"],
-        "month_year": doc["month_year"]
-    }
+    return model_response(demanda_model(doc))
 
 
 @app.put("/api/demandas/{demanda_id}/status")
@@ -264,20 +1222,57 @@ async def update_status(demanda_id: str, status: str = Form(...)):
     if status not in STATUS_OPTIONS:
         raise HTTPException(status_code=400, detail=f"Status inválido. Use: {STATUS_OPTIONS}")
     
+    change = await next_change()
     try:
-        result = await demandas_collection.update_one(
+        doc = await demandas_collection.find_one_and_update(
             {"_id": ObjectId(demanda_id)},
-            {"$set": {"status": status}}
+            {"$set": {"status": status, **change}},
+            projection={"numero": 1, "month_year": 1, "status": 1, "solicitante": 1}
         )
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    if result.matched_count == 0:
+    if not doc:
         raise HTTPException(status_code=404, detail="Demanda não encontrada")
     
+    await update_month_stats(doc["month_year"], doc, {**doc, "status": status})
+    await touch_month(doc["month_year"])
+    await publish_change("updated", {**doc, "status": status}, ["status"])
+    
     return {"message": "Status atualizado", "status": status}
 
 
+async def push_entregas(object_id: ObjectId, entregas: List[dict]):
+    """Append to a demanda's entregas in a single atomic update.
+
+    Returns the demanda's numero, month_year and entrega ids after the push, or None
+    if the demanda does not exist.
+    """
+    projection = {"numero": 1, "month_year": 1, "entregas.id": 1}
+    change = await next_change()
+    while True:
+        doc = await demandas_collection.find_one_and_update(
+            {"_id": object_id, "entregas": {"$type": "array"}},
+            {"$push": {"entregas": {"$each": entregas}}, "$set": change},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return doc
+        # No entregas yet (null or missing field): start the array, unless
+        # a concurrent request has just done so
+        doc = await demandas_collection.find_one_and_update(
+            {"_id": object_id, "entregas": None},
+            {"$set": {"entregas": entregas, **change}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            return doc
+        if not await demandas_collection.count_documents({"_id": object_id}, limit=1):
+            return None
+
+
 @app.post("/api/demandas/{demanda_id}/entregas")
 async def add_entrega(
     demanda_id: str,
@@ -285,62 +1280,64 @@ async def add_entrega(
     entrega_files: List[UploadFile] = File(default=[])
 ):
     try:
-        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)})
+        object_id = ObjectId(demanda_id)
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    if not doc:
-        raise HTTPException(status_code=404, detail="Demanda não encontrada")
-    
-    entregas = doc.get("entregas") or []
+    entregas = []
     
     # Process links
     if entrega_links:
         for link in entrega_links.split(","):
             link = link.strip()
             if link:
-                entregas.append({"type": "link", "url": link, "added_at": datetime.now(timezone.utc).isoformat()})
+                entregas.append({"type": "link", "url": link})
     
     # Process files
-    for file in entrega_files:
-        if file.filename:
-            contents = await file.read()
-            entregas.append({
-                "type": "file",
-                "filename": file.filename,
-                "mime_type": file.content_type,
-                "file_data": base64.b64encode(contents).decode("utf-8"),
-                "added_at": datetime.now(timezone.utc).isoformat()
-            })
+    stored = await store_uploads(entrega_files)
+    entregas.extend(stored)
     
-    await demandas_collection.update_one(
-        {"_id": ObjectId(demanda_id)},
-        {"$set": {"entregas": entregas}}
-    )
+    added_at = datetime.now(timezone.utc).isoformat()
+    for entrega in entregas:
+        entrega["id"] = str(ObjectId())
+        entrega["added_at"] = added_at
     
-    return {"message": "Entregas adicionadas", "total": len(entregas)}
+    try:
+        doc = await push_entregas(object_id, entregas)
+    finally:
+        await release_blob_leases([item["file_id"] for item in stored])
+    if not doc:
+        await release_attachments(entregas)
+        raise HTTPException(status_code=404, detail="Demanda não encontrada")
+    
+    await touch_month(doc["month_year"])
+    await publish_change("updated", doc, ["entregas"])
+    
+    return {"message": "Entregas adicionadas", "total": len(doc["entregas"])}
 
 
-@app.delete("/api/demandas/{demanda_id}/entregas/{entrega_index}")
-async def remove_entrega(demanda_id: str, entrega_index: int):
+@app.delete("/api/demandas/{demanda_id}/entregas/{entrega_id}")
+async def remove_entrega(demanda_id: str, entrega_id: str):
     try:
-        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)})
+        object_id = ObjectId(demanda_id)
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    if not doc:
-        raise HTTPException(status_code=404, detail="Demanda não encontrada")
-    
-    entregas = doc.get("entregas") or []
-    if entrega_index < 0 or entrega_index >= len(entregas):
-        raise HTTPException(status_code=400, detail="Índice de entrega inválido")
+    # The pre-update document's matched element is the entrega being removed
+    doc = await demandas_collection.find_one_and_update(
+        {"_id": object_id, "entregas.id": entrega_id},
+        {"$pull": {"entregas": {"id": entrega_id}}, "$set": await next_change()},
+        projection={"numero": 1, "month_year": 1, "entregas": {"$elemMatch": {"id": entrega_id}}}
+    )
     
-    entregas.pop(entrega_index)
+    if not doc:
+        if not await demandas_collection.count_documents({"_id": object_id}, limit=1):
+            raise HTTPException(status_code=404, detail="Demanda não encontrada")
+        raise HTTPException(status_code=404, detail="Entrega não encontrada")
     
-    await demandas_collection.update_one(
-        {"_id": ObjectId(demanda_id)},
-        {"$set": {"entregas": entregas if entregas else None}}
-    )
+    await touch_month(doc["month_year"])
+    await publish_change("updated", doc, ["entregas"])
+    await release_attachments(doc["entregas"])
     
     return {"message": "Entrega removida"}
 
@@ -348,13 +1345,22 @@ async def remove_entrega(demanda_id: str, entrega_index: int):
 @app.delete("/api/demandas/{demanda_id}")
 async def delete_demanda(demanda_id: str):
     try:
-        result = await demandas_collection.delete_one({"_id": ObjectId(demanda_id)})
+        deleted = await demandas_collection.find_one_and_delete(
+            {"_id": ObjectId(demanda_id)},
+            projection={"numero": 1, "referencias": 1, "entregas": 1, "month_year": 1, "status": 1, "solicitante": 1}
+        )
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Demanda não encontrada")
     
+    await add_tombstones([deleted["_id"]], await next_changes())
+    await update_month_stats(deleted["month_year"], deleted, None)
+    await touch_month(deleted["month_year"])
+    await publish_change("deleted", deleted)
+    await release_attachments(deleted.get("referencias"), deleted.get("entregas"))
+    
     return {"message": "Demanda excluída"}
 
 
@@ -366,13 +1372,10 @@ async def update_demanda(
     status: Optional[str] = Form(None)
 ):
     try:
-        existing = await demandas_collection.find_one({"_id": ObjectId(demanda_id)})
+        object_id = ObjectId(demanda_id)
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    if not existing:
-        raise HTTPException(status_code=404, detail="Demanda não encontrada")
-    
     update_data = {}
     if solicitante:
         update_data["solicitante"] = solicitante
@@ -382,26 +1385,457 @@ async def update_demanda(
         update_data["status"] = status
     
     if update_data:
+        # The pre-update document tells exactly which counters this write moved
+        change = await next_change()
+        existing = await demandas_collection.find_one_and_update(
+            {"_id": object_id},
+            {"$set": {**update_data, **change}},
+            projection={"numero": 1, "month_year": 1, "status": 1, "solicitante": 1, "demanda": 1}
+        )
+    else:
+        existing = await demandas_collection.find_one({"_id": object_id}, {"_id": 1})
+    
+    if not existing:
+        raise HTTPException(status_code=404, detail="Demanda não encontrada")
+    
+    if "solicitante" in update_data or "demanda" in update_data:
+        # Conditioned on the fields the tokens are built from, so an edit
+        # landing in between keeps its own tokens; other writes do not matter
+        updated = {**existing, **update_data}
         await demandas_collection.update_one(
-            {"_id": ObjectId(demanda_id)},
-            {"$set": update_data}
+            {"_id": object_id, "solicitante": updated["solicitante"], "demanda": updated["demanda"]},
+            {"$set": {"search_tokens": document_tokens(updated)}}
         )
     
+    if update_data:
+        await update_month_stats(existing["month_year"], existing, {**existing, **update_data})
+        await touch_month(existing["month_year"])
+        await publish_change("updated", {**existing, **update_data}, list(update_data))
+    
     return {"message": "Demanda atualizada"}
 
 
-# ============ WHATSAPP TEXT ============
+# Fields bulk operations need from the current state of each demanda
+BULK_PROJECTION = {
+    "numero": 1, "month_year": 1, "status": 1, "solicitante": 1, "demanda": 1,
+    "referencias.type": 1, "referencias.file_id": 1, "referencias.derivatives": 1,
+    "entregas.type": 1, "entregas.file_id": 1, "entregas.derivatives": 1,
+}
 
-@app.get("/api/demandas/{demanda_id}/whatsapp")
-async def get_whatsapp_text(demanda_id: str):
+
+# Fields every bulk write is conditioned on
+BULK_GUARDED_FIELDS = ("status", "solicitante", "demanda")
+
+
+def bulk_update_data(operation: BulkOperation) -> dict:
+    """$set for a status or update operation; raises ValueError if it is invalid."""
+    if operation.op == "status":
+        if operation.status not in STATUS_OPTIONS:
+            raise ValueError(f"Status inválido. Use: {STATUS_OPTIONS}")
+        return {"status": operation.status}
+    
+    # Same rules as PUT /api/demandas/{id}
+    update_data = {}
+    if operation.solicitante:
+        update_data["solicitante"] = operation.solicitante
+    if operation.demanda:
+        update_data["demanda"] = operation.demanda
+    if operation.status and operation.status in STATUS_OPTIONS:
+        update_data["status"] = operation.status
+    return update_data
+
+
+@app.post("/api/demandas/bulk")
+async def bulk_demandas(bulk: BulkRequest):
+    """Apply status changes, field updates and deletions in one bulk_write.
+
+    Every write is conditioned on the status, solicitante and demanda read
+    beforehand, so the month counters and search tokens can be derived from
+    those values; a demanda changed in between is reported as a conflict
+    instead of being overwritten. With
+    ``ordered`` (the default), processing stops at the first invalid
+    operation or write error and the rest are reported as skipped.
+    """
+    operations = bulk.operations
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BULK_OPERATIONS} operações por requisição")
+    
+    results = [{"index": i, "id": op.id, "status": "skipped"} for i, op in enumerate(operations)]
+    
+    object_ids = {}
+    for operation in operations:
+        try:
+            object_ids[operation.id] = ObjectId(operation.id)
+        except Exception:
+            pass
+    current = {}
+    async for doc in demandas_collection.find({"_id": {"$in": list(object_ids.values())}}, BULK_PROJECTION):
+        current[str(doc["_id"])] = doc
+    
+    # (index, before, after, position in writes or None for no-ops); state is
+    # tracked per demanda so later operations on the same demanda build on
+    # the earlier ones
+    planned = []
+    writes = []
+    for i, operation in enumerate(operations):
+        before = current.get(operation.id)
+        try:
+            if operation.id not in object_ids:
+                raise ValueError("ID inválido")
+            if operation.op not in ("status", "update", "delete"):
+                raise ValueError("Operação inválida. Use: status, update, delete")
+            if before is None:
+                raise ValueError("Demanda não encontrada")
+            update_data = bulk_update_data(operation) if operation.op != "delete" else None
+        except ValueError as exc:
+            results[i].update(status="error", error=str(exc))
+            if bulk.ordered:
+                break
+            continue
+        
+        expected = {key: before[key] for key in ("_id", *BULK_GUARDED_FIELDS)}
+        if operation.op == "delete":
+            after = None
+            del current[operation.id]
+        else:
+            after = {**before, **update_data}
+            current[operation.id] = after
+            if "solicitante" in update_data or "demanda" in update_data:
+                update_data = {**update_data, "search_tokens": document_tokens(after)}
+        write = None
+        if after is None or update_data:
+            writes.append((expected, update_data))
+            write = len(writes) - 1
+        planned.append((i, before, after, write))
+    
+    # Stamp all writes for delta sync with one counter update
+    changes = await next_changes(len(writes)) if writes else []
+    writes = [
+        DeleteOne(expected) if update_data is None else UpdateOne(expected, {"$set": {**update_data, **change}})
+        for (expected, update_data), change in zip(writes, changes)
+    ]
+    
+    write_errors = {}
+    applied = 0
+    if writes:
+        try:
+            result = await demandas_collection.bulk_write(writes, ordered=bulk.ordered)
+            applied = result.matched_count + result.deleted_count
+        except BulkWriteError as exc:
+            applied = exc.details["nMatched"] + exc.details["nRemoved"]
+            for error in exc.details["writeErrors"]:
+                write_errors[error["index"]] = error["errmsg"]
+    
+    # An ordered bulk_write stops at its first error; what follows it is skipped
+    stop_index = None
+    if bulk.ordered and write_errors:
+        stop_index = next(i for i, _, _, write in planned if write == min(write_errors))
+    
+    # Writes that matched nothing were preempted by a concurrent change; the
+    # final state tells which demandas ended up as this request left them
+    final_state = None
+    attempted = len(writes) if stop_index is None else min(write_errors) + 1
+    if applied != attempted - len(write_errors):
+        final_state = {
+            str(doc["_id"]): doc async for doc in demandas_collection.find(
+                {"_id": {"$in": [before["_id"] for _, before, _, write in planned if write is not None]}},
+                {field: 1 for field in BULK_GUARDED_FIELDS}
+            )
+        }
+    # Writes to the same demanda are chained, each conditioned on the state the
+    # previous one left, so the last one attempted decides for all of them
+    final_after = {}
+    for i, before, after, write in planned:
+        if write is not None and write not in write_errors and (stop_index is None or i <= stop_index):
+            final_after[str(before["_id"])] = after
+    
+    months = {}
+    deleted = []
+    deleted_changes = []
+    events = []
+    for i, before, after, write in planned:
+        if stop_index is not None and i > stop_index:
+            break
+        if write in write_errors:
+            results[i].update(status="error", error=write_errors[write])
+            continue
+        if write is not None and final_state is not None:
+            doc = final_state.get(str(before["_id"]))
+            expected_final = final_after[str(before["_id"])]
+            if expected_final is None:
+                landed = doc is None
+            else:
+                landed = doc is not None and all(doc[k] == expected_final[k] for k in BULK_GUARDED_FIELDS)
+            if not landed:
+                results[i].update(status="error", error="Demanda alterada por outra requisição")
+                continue
+        
+        results[i]["status"] = "ok"
+        inc = months.setdefault(before["month_year"], {})
+        for field, value in month_stats_delta(before, after).items():
+            inc[field] = inc.get(field, 0) + value
+        if after is None:
+            deleted.append(before)
+            deleted_changes.append(changes[write])
+            events.append(("deleted", before, []))
+        elif write is not None:
+            events.append(("updated", after, [k for k in after if k not in before or after[k] != before[k]]))
+    
+    await add_tombstones([doc["_id"] for doc in deleted], deleted_changes)
+    for month_year, inc in months.items():
+        await apply_month_stats(month_year, {field: value for field, value in inc.items() if value})
+        await touch_month(month_year)
+    for change_type, doc, fields in events:
+        await publish_change(change_type, doc, fields)
+    for doc in deleted:
+        await release_attachments(doc.get("referencias"), doc.get("entregas"))
+    
+    return {
+        "ordered": bulk.ordered,
+        "ok": sum(1 for result in results if result["status"] == "ok"),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+        "results": results
+    }
+
+
+# ============ EVENTS ============
+
+@app.get("/api/events")
+async def stream_events():
+    """Server-Sent Events stream of demanda changes.
+
+    Events are named "demanda" and carry {"type", "id", "numero", "fields",
+    "status"}. The stream ends when the client falls behind; EventSource
+    reconnects on its own and the client resyncs through /api/demandas/changes.
+    """
+    async def event_stream():
+        async with event_broker.subscribe() as subscription:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing idle connections
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield f"event: demanda\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ============ ATTACHMENT DOWNLOADS ============
+
+def parse_range(range_header: str, size: int):
+    """Parse a single-range ``bytes=`` header into an inclusive (start, end).
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises 416 when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[6:].strip().partition("-")
     try:
-        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)})
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end or size == 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Intervalo solicitado inválido",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def weak_etag(*parts) -> str:
+    """Weak validator derived from cheap version numbers instead of the body."""
+    digest = hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def validator_headers(etag: Optional[str]) -> dict:
+    # No ETag while a version cannot be trusted yet; clients must not reuse the body
+    if etag is None:
+        return {"Cache-Control": "no-store"}
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(request: Request, etag: Optional[str]) -> bool:
+    return etag is not None and etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def iter_file(fh):
+    with fh:
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_range(path: Path, start: int, length: int):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: Optional[Path], etag: str, cache_control: str, filename: str,
+                  mime_type: Optional[str], disposition: str = "inline", size: Optional[int] = None,
+                  data: Optional[bytes] = None):
+    """Serve the file at ``path`` with Range, ETag and caching support.
+
+    With ``data``, those bytes are served instead of a file.
+    """
+    if data is not None:
+        size = len(data)
+    elif not path.is_file():
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    elif size is None:
+        size = path.stat().st_size
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"{disposition}; filename*=UTF-8''{quote(filename)}",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    status_code = 200
+    start, length = 0, size
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    return StreamingResponse(
+        iter_range(path, start, length) if data is None else iter([data[start:start + length]]),
+        status_code=status_code,
+        media_type=mime_type or "application/octet-stream",
+        headers=headers
+    )
+
+
+def attachment_response(request: Request, item: dict, disposition: str = "inline", version: str = None):
+    """Serve a stored attachment from the blob store.
+
+    ``version`` is the file_id links pin with ``?v=``; for a derivative, that
+    of its original, which determines it.
+    """
+    file_id = item["file_id"]
+
+    # Links that pin the content hash (?v=<file_id>) can be cached forever.
+    # Attachments are addressed by position, which shifts when one is
+    # removed: a pinned link must never be answered with another file
+    pinned = request.query_params.get("v")
+    if pinned is not None and pinned != (version or file_id):
+        raise HTTPException(status_code=404, detail="Anexo não encontrado")
+    if pinned is not None:
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = f"public, max-age={ATTACHMENT_CACHE_MAX_AGE}"
+
+    return file_response(
+        request, blob_store.path_for(file_id), f'"{item.get("sha256") or file_id}"', cache_control,
+        item.get("filename") or file_id, item.get("mime_type"), disposition, item.get("size"),
+        item.get("data")
+    )
+
+
+def decode_embedded(item: dict) -> dict:
+    """Give an attachment embedded by an earlier release the fields of a stored one.
+
+    The decoded bytes ride along as ``data``; the blob store is left to
+    ``backfill_embedded_files``, which moves them under a lease.
+    """
+    item = dict(item)
+    data = base64.b64decode(item.pop("file_data"))
+    digest = hashlib.sha256(data).hexdigest()
+    item.update({"file_id": digest, "size": len(data), "sha256": digest, "data": data})
+    return item
+
+
+def attachment_variant(item: dict, variant: Optional[str]) -> dict:
+    """Pick the original file or one of its image derivatives."""
+    if not variant:
+        return item
+    derivative = (item.get("derivatives") or {}).get(variant)
+    if not derivative:
+        raise HTTPException(status_code=404, detail="Versão do arquivo não disponível")
+    stem = (item.get("filename") or derivative["file_id"]).rsplit(".", 1)[0]
+    return {**derivative, "filename": f"{stem}_{variant}.jpg"}
+
+
+async def get_attachment(demanda_id: str, field: str, index: int) -> dict:
+    if index < 0:
+        raise HTTPException(status_code=404, detail="Anexo não encontrado")
+    try:
+        doc = await demandas_collection.find_one(
+            {"_id": ObjectId(demanda_id)},
+            {field: {"$slice": [index, 1]}}
+        )
     except Exception:
         raise HTTPException(status_code=400, detail="ID inválido")
-    
+
     if not doc:
         raise HTTPException(status_code=404, detail="Demanda não encontrada")
-    
+
+    item = (doc.get(field) or [{}])[0]
+    if item.get("type") == "file" and not item.get("file_id") and item.get("file_data"):
+        # Embedded by an earlier release and not moved by backfill_embedded_files yet
+        item = await run_in_threadpool(decode_embedded, item)
+    if item.get("type") != "file" or not item.get("file_id"):
+        raise HTTPException(status_code=404, detail="Anexo não encontrado")
+    return item
+
+
+@app.get("/api/demandas/{demanda_id}/referencias/{index}")
+async def download_referencia(demanda_id: str, index: int, request: Request, variant: Optional[str] = None):
+    item = await get_attachment(demanda_id, "referencias", index)
+    return attachment_response(request, attachment_variant(item, variant), version=item["file_id"])
+
+
+@app.get("/api/demandas/{demanda_id}/entregas/{index}")
+async def download_entrega(demanda_id: str, index: int, request: Request, variant: Optional[str] = None):
+    item = await get_attachment(demanda_id, "entregas", index)
+    return attachment_response(request, attachment_variant(item, variant), version=item["file_id"])
+
+
+# ============ WHATSAPP TEXT ============
+
+def whatsapp_text(doc: dict) -> str:
     text_lines = [
         f"*Demanda {doc['numero']}*",
         f"Solicitante: {doc['solicitante']}",
@@ -419,183 +1853,583 @@ async def get_whatsapp_text(demanda_id: str):
                 entrega_items.append(f"[Arquivo: {e['filename']}]")
         text_lines.append(f"Entrega: {', '.join(entrega_items)}")
     
-    return {"text": "\n".join(text_lines)}
+    return "\n".join(text_lines)
+
+
+@app.get("/api/demandas/{demanda_id}/whatsapp")
+async def get_whatsapp_text(demanda_id: str):
+    try:
+        doc = await demandas_collection.find_one({"_id": ObjectId(demanda_id)}, WHATSAPP_PROJECTION)
+    except Exception:
+        raise HTTPException(status_code=400, detail="ID inválido")
+    
+    if not doc:
+        raise HTTPException(status_code=404, detail="Demanda não encontrada")
+    
+    return {"text": whatsapp_text(doc)}
+
+
+@app.post("/api/whatsapp/batch")
+async def get_whatsapp_batch(batch: WhatsappBatchRequest):
+    """WhatsApp messages for the given ids, or for every demanda matching a
+    month and/or status filter, from a single query.
+
+    Messages follow the order of ``ids``, or creation order for a filter;
+    ids that do not exist are listed under ``missing``.
+    """
+    if batch.ids is not None:
+        if len(batch.ids) > MAX_WHATSAPP_BATCH:
+            raise HTTPException(status_code=400, detail=f"Máximo de {MAX_WHATSAPP_BATCH} demandas por requisição")
+        try:
+            object_ids = [ObjectId(demanda_id) for demanda_id in batch.ids]
+        except Exception:
+            raise HTTPException(status_code=400, detail="ID inválido")
+        
+        docs = {}
+        async for doc in demandas_collection.find({"_id": {"$in": object_ids}}, WHATSAPP_PROJECTION):
+            docs[str(doc["_id"])] = doc
+        ordered = [docs[demanda_id] for demanda_id in dict.fromkeys(batch.ids) if demanda_id in docs]
+        missing = [demanda_id for demanda_id in dict.fromkeys(batch.ids) if demanda_id not in docs]
+    else:
+        if not (batch.month and batch.year) and not batch.status:
+            raise HTTPException(status_code=400, detail="Informe ids, mês/ano ou status")
+        conditions = demandas_conditions(batch.month, batch.year, batch.status, None, None)
+        cursor = demandas_collection.find(and_query(conditions), WHATSAPP_PROJECTION) \
+            .sort([("created_at", 1), ("_id", 1)]).limit(MAX_WHATSAPP_BATCH + 1)
+        ordered = await cursor.to_list(length=None)
+        if len(ordered) > MAX_WHATSAPP_BATCH:
+            raise HTTPException(status_code=400, detail=f"Máximo de {MAX_WHATSAPP_BATCH} demandas por requisição")
+        missing = []
+    
+    messages = [
+        {"id": str(doc["_id"]), "numero": doc["numero"], "text": whatsapp_text(doc)}
+        for doc in ordered
+    ]
+    result = {"messages": messages, "missing": missing}
+    
+    if batch.digest:
+        title = "*Resumo de demandas*"
+        if batch.ids is None and batch.month and batch.year:
+            title = f"*Resumo de demandas — {get_month_year_pt(f'{batch.month.zfill(2)}/{batch.year}')}*"
+        if batch.ids is None and batch.status:
+            title += f"\nStatus: {batch.status}"
+        result["digest"] = "\n\n".join([f"{title}\nTotal: {len(messages)}"] + [m["text"] for m in messages])
+    
+    return result
 
 
 # ============ MONTHLY PDF REPORT ============
 
+def report_snapshot(doc: dict) -> dict:
+    """Reduce a demanda to the plain data the report worker needs."""
+    entregas = []
+    for entrega in doc.get("entregas") or []:
+        item = {"type": entrega["type"], "url": entrega.get("url"), "filename": entrega.get("filename")}
+        mime = entrega.get("mime_type") or ""
+        derivative = (entrega.get("derivatives") or {}).get("report")
+        if derivative:
+            item["image_path"] = str(blob_store.path_for(derivative["file_id"]))
+            item["image_size"] = (derivative["width"], derivative["height"])
+        elif mime.startswith("image/") and entrega.get("file_id"):
+            # Uploaded before derivatives existed: the worker decodes the original
+            item["image_path"] = str(blob_store.path_for(entrega["file_id"]))
+        entregas.append(item)
+    return {
+        "numero": doc["numero"],
+        "solicitante": doc["solicitante"],
+        "demanda": doc["demanda"],
+        "status": doc["status"],
+        "referencias": [
+            {"type": ref["type"], "url": ref.get("url"), "filename": ref.get("filename")}
+            for ref in doc.get("referencias") or []
+        ],
+        "entregas": entregas
+    }
+
+
+async def get_report_summary(month_year: str) -> dict:
+    stats = await get_month_stats(month_year)
+    return {"total": stats["total"], "finalizadas": stats["by_status"]["Finalizado"]}
+
+
+async def feed_report_batches(month_year: str, batches, render: asyncio.Future) -> float:
+    """Stream the month's demandas from Mongo into the worker's queue in batches.
+
+    Returns the seconds spent reading from Mongo, waits on the queue excluded.
+    """
+    queue_wait = 0.0
+    
+    async def put(item) -> bool:
+        nonlocal queue_wait
+        started = time.perf_counter()
+        try:
+            return await put_when_free(item)
+        finally:
+            queue_wait += time.perf_counter() - started
+    
+    async def put_when_free(item) -> bool:
+        # The queue is bounded: wait for the worker to catch up, unless it is gone
+        while not render.done():
+            try:
+                await run_in_threadpool(batches.put, item, True, 1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    started = time.perf_counter()
+    cursor = demandas_collection.find(
+        {"month_year": month_year}, REPORT_PROJECTION, batch_size=REPORT_BATCH_SIZE
+    ).sort([("created_at", 1), ("_id", 1)])
+    batch = []
+    try:
+        async for doc in cursor:
+            batch.append(report_snapshot(doc))
+            if len(batch) == REPORT_BATCH_SIZE:
+                if not await put(batch):
+                    break
+                batch = []
+        else:
+            if batch:
+                await put(batch)
+    finally:
+        await put(None)
+    return time.perf_counter() - started - queue_wait
+
+
+async def render_report_file(month_year: str, summary: dict, progress=None) -> str:
+    """Render the month's report into a new file and return its path.
+
+    Documents are read from the cursor in batches while the worker lays them
+    out, so neither process ever holds the whole month.
+    """
+    output_path = report_cache.new_path()
+    batches = report_renderer.batch_queue(maxsize=4)
+    render = asyncio.ensure_future(report_renderer.run(
+        render_monthly_pdf, month_year, summary, batches, output_path, progress
+    ))
+    feeder = asyncio.ensure_future(feed_report_batches(month_year, batches, render))
+    try:
+        timings, fetch_seconds = await asyncio.gather(render, feeder)
+    except BaseException:
+        feeder.cancel()
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        raise
+    report_phase_seconds.observe(fetch_seconds, phase="fetch")
+    for phase, seconds in timings.items():
+        report_phase_seconds.observe(seconds, phase=phase)
+    return output_path
+
+
+def report_filename(month_year: str) -> str:
+    return f"relatorio_{month_year.replace('/', '-')}.pdf"
+
+
 @app.get("/api/relatorio/{month}/{year}/pdf")
-async def generate_monthly_pdf(month: str, year: str):
+async def generate_monthly_pdf(month: str, year: str, request: Request):
     month_year = f"{month.zfill(2)}/{year}"
     
-    cursor = demandas_collection.find({"month_year": month_year}).sort("created_at", 1)
-    demandas = []
-    async for doc in cursor:
-        demandas.append(doc)
-    
-    if not demandas:
-        raise HTTPException(status_code=404, detail="Nenhuma demanda encontrada para este mês")
+    # The month's content version identifies the PDF, so it doubles as ETag
+    version = await get_month_version(month_year)
+    headers = {
+        "ETag": f'"relatorio-{month_year.replace("/", "-")}-v{version}"',
+        "Cache-Control": "private, no-cache"
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
     
-    buffer = io.BytesIO()
+    report_file = None
+    path = report_cache.get(month_year, version)
+    if path is not None:
+        try:
+            report_file = open(path, "rb")
+        except FileNotFoundError:
+            pass  # evicted since the lookup
     
-    pdf_doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
+    if report_file is None:
+        summary = await get_report_summary(month_year)
+        
+        if not summary["total"]:
+            raise HTTPException(status_code=404, detail="Nenhuma demanda encontrada para este mês")
+        
+        try:
+            path = await render_report_file(month_year, summary)
+        except ReportTimeout:
+            raise HTTPException(status_code=504, detail="Tempo esgotado ao gerar o relatório")
+        
+        # Open before handing the file to the cache: eviction only unlinks it
+        report_file = open(path, "rb")
+        if not report_cache.put(month_year, version, path):
+            os.unlink(path)
     
-    styles = getSampleStyleSheet()
+    filename = report_filename(month_year)
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    headers["Content-Length"] = str(os.fstat(report_file.fileno()).st_size)
     
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=6,
-        fontName='Times-Bold'
+    return StreamingResponse(iter_file(report_file), media_type="application/pdf", headers=headers)
+
+
+# ============ REPORT JOBS ============
+
+# Background render tasks of this process, kept referenced until they finish
+report_job_tasks = set()
+
+
+def utc_isoformat(value: Optional[datetime]) -> Optional[str]:
+    # Mongo hands datetimes back naive; they were stored as UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def report_job_response(job: dict) -> dict:
+    month, year = job["month_year"].split("/")
+    response = {
+        "id": str(job["_id"]),
+        "month_year": job["month_year"],
+        "status": job["status"],
+        "processed": job.get("processed", 0),
+        "total": job.get("total"),
+        "error": job.get("error"),
+        "created_at": utc_isoformat(job["created_at"]),
+        "finished_at": utc_isoformat(job.get("finished_at")),
+        "download_url": None
+    }
+    if job["status"] == "done":
+        response["download_url"] = f"/api/relatorio/{month}/{year}/jobs/{response['id']}/pdf"
+    return response
+
+
+def report_job_path(job_id: ObjectId) -> Path:
+    """Where a finished job's PDF is kept; outside the attachment store, whose
+    blobs are shared with demandas, and outside any process's report cache."""
+    return Path(REPORT_CACHE_DIR) / "jobs" / f"{job_id}.pdf"
+
+
+def store_job_report(path: str, job_id: ObjectId) -> dict:
+    target = report_job_path(job_id)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(path, target)
+    return {"size": target.stat().st_size}
+
+
+async def prune_report_jobs():
+    """Drop finished jobs older than REPORT_JOB_TTL and abandoned active ones."""
+    now = datetime.now(timezone.utc)
+    expired = {"finished_at": {"$lt": now - timedelta(seconds=REPORT_JOB_TTL)}}
+    async for job in report_jobs_collection.find(expired, {"result": 1}):
+        await report_jobs_collection.delete_one({"_id": job["_id"]})
+        if (job.get("result") or {}).get("file_id"):
+            # Kept in the attachment store by earlier releases, where a demanda may share the blob
+            await release_attachments([{"type": "file", **job["result"]}])
+        else:
+            await run_in_threadpool(report_job_path(job["_id"]).unlink, missing_ok=True)
+
+    # A job whose worker died stops heartbeating; let a new request replace it
+    stale_before = now - timedelta(seconds=REPORT_TIMEOUT + 60)
+    await report_jobs_collection.update_many(
+        {"active": True, "updated_at": {"$lt": stale_before}},
+        {"$set": {"status": "failed", "error": "Geração interrompida", "finished_at": now},
+         "$unset": {"active": ""}}
     )
+
+
+async def run_report_job(job_id: ObjectId, month_year: str):
+    async def update(**fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        await report_jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def finish(**fields):
+        fields["finished_at"] = fields["updated_at"] = datetime.now(timezone.utc)
+        await report_jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": fields, "$unset": {"active": ""}}
+        )
+
+    try:
+        await update(status="running")
+        version = await get_month_version(month_year)
+        summary = await get_report_summary(month_year)
+        if not summary["total"]:
+            await finish(status="failed", error="Nenhuma demanda encontrada para este mês")
+            return
+        await update(total=summary["total"])
+
+        progress = report_renderer.progress_counter()
+        render = asyncio.ensure_future(render_report_file(month_year, summary, progress))
+        while not render.done():
+            await asyncio.wait([render], timeout=1)
+            await update(processed=progress.value)
+
+        path = render.result()
+        stored = await run_in_threadpool(store_job_report, path, job_id)
+        if not report_cache.put(month_year, version, path):
+            os.unlink(path)
+        await finish(status="done", processed=summary["total"], result=stored)
+    except ReportTimeout:
+        await finish(status="failed", error="Tempo esgotado ao gerar o relatório")
+    except Exception as exc:
+        logger.exception("Report job %s failed", job_id)
+        await finish(status="failed", error=str(exc))
+
+
+@app.post("/api/relatorio/{month}/{year}/jobs", status_code=202)
+async def create_report_job(month: str, year: str):
+    """Queue a report render, or join the one already running for the month"""
+    month_year = f"{month.zfill(2)}/{year}"
+    await prune_report_jobs()
     
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Normal'],
-        fontSize=11,
-        alignment=TA_CENTER,
-        spaceAfter=3,
-        fontName='Times-Roman'
-    )
+    now = datetime.now(timezone.utc)
+    new_id = ObjectId()
+    try:
+        job = await report_jobs_collection.find_one_and_update(
+            {"month_year": month_year, "active": True},
+            {"$setOnInsert": {
+                "_id": new_id,
+                "month_year": month_year,
+                "status": "queued",
+                "processed": 0,
+                "total": None,
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        job = await report_jobs_collection.find_one({"month_year": month_year, "active": True})
     
-    section_title_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        alignment=TA_LEFT,
-        spaceBefore=15,
-        spaceAfter=6,
-        fontName='Times-Bold'
-    )
+    if job["_id"] == new_id:
+        task = asyncio.create_task(run_report_job(new_id, month_year))
+        report_job_tasks.add(task)
+        task.add_done_callback(report_job_tasks.discard)
     
-    body_style = ParagraphStyle(
-        'Body',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=8,
-        fontName='Times-Roman',
-        leading=14
-    )
+    return report_job_response(job)
+
+
+async def get_report_job_doc(month: str, year: str, job_id: str) -> dict:
+    month_year = f"{month.zfill(2)}/{year}"
+    try:
+        job = await report_jobs_collection.find_one({"_id": ObjectId(job_id), "month_year": month_year})
+    except Exception:
+        raise HTTPException(status_code=400, detail="ID inválido")
     
-    small_style = ParagraphStyle(
-        'Small',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_LEFT,
-        spaceAfter=4,
-        fontName='Times-Roman',
-        textColor=colors.gray
+    if not job:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return job
+
+
+@app.get("/api/relatorio/{month}/{year}/jobs/{job_id}")
+async def get_report_job(month: str, year: str, job_id: str):
+    return report_job_response(await get_report_job_doc(month, year, job_id))
+
+
+@app.get("/api/relatorio/{month}/{year}/jobs/{job_id}/pdf")
+async def download_report_job(month: str, year: str, job_id: str, request: Request):
+    job = await get_report_job_doc(month, year, job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail="Relatório ainda não está pronto")
+    
+    filename = report_filename(job["month_year"])
+    if job["result"].get("file_id"):
+        # Rendered by an earlier release into the attachment store
+        item = {**job["result"], "filename": filename, "mime_type": "application/pdf"}
+        return attachment_response(request, item, disposition="attachment")
+    return file_response(
+        request, report_job_path(job["_id"]), f'"relatorio-job-{job["_id"]}"',
+        f"public, max-age={ATTACHMENT_CACHE_MAX_AGE}", filename, "application/pdf",
+        disposition="attachment", size=job["result"].get("size")
     )
+
+
+# ============ MONTHLY EXPORT ============
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "zip": "application/zip",
+}
+
+
+async def month_export_docs(month_year: str):
+    """Yield the month's demandas oldest first, one keyset page at a time.
+
+    Each page is read whole before its documents are handed out, so no
+    server cursor stays open (and idles out) while a slow client is fed.
+    """
+    query = {"month_year": month_year}
+    while True:
+        docs = await demandas_collection.find(query, EXPORT_PROJECTION).sort(
+            [("created_at", 1), ("_id", 1)]
+        ).limit(REPORT_BATCH_SIZE).to_list(length=REPORT_BATCH_SIZE)
+        for doc in docs:
+            yield doc
+        if len(docs) < REPORT_BATCH_SIZE:
+            return
+        # Continue strictly after the last (created_at, _id) seen
+        last = docs[-1]
+        query = {
+            "month_year": month_year,
+            "$or": [
+                {"created_at": {"$gt": last["created_at"]}},
+                {"created_at": last["created_at"], "_id": {"$gt": last["_id"]}}
+            ]
+        }
+
+
+async def iter_month_csv(month_year: str):
+    # BOM so spreadsheet apps read the accents as UTF-8
+    yield "\ufeff" + csv_line(EXPORT_COLUMNS)
+    async for doc in month_export_docs(month_year):
+        yield csv_line(export_row(doc))
+
+
+async def iter_month_zip(month_year: str):
+    """Stream a ZIP with the month's summary and every stored file.
+
+    Entregas go under ``<numero>/`` and referências under
+    ``<numero>/referencias/``. Documents are read a page at a time and
+    files are copied one chunk at a time, so memory use does not grow with
+    the month; the summary is spooled to disk until the files are written.
+    """
+    archive = ZipStream()
+    summary = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE, mode="w+", encoding="utf-8", newline="")
+    summary.write("\ufeff" + csv_line(EXPORT_COLUMNS))
     
-    elements = []
-    
-    # Header
-    month_year_pt = get_month_year_pt(month_year)
-    elements.append(Paragraph(f"Relatório de Produção", title_style))
-    elements.append(Paragraph(f"{month_year_pt}", title_style))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph("Nome: Gustavo Ferreira Santos", header_style))
-    elements.append(Paragraph("Cargo: Assessor Especial 3", header_style))
-    elements.append(Paragraph("Secretária: Sheila Cristina", header_style))
-    elements.append(Paragraph("Prefeitura Municipal de Canaã dos Carajás", header_style))
-    elements.append(Spacer(1, 20))
-    
-    # Summary
-    total = len(demandas)
-    finalizadas = sum(1 for d in demandas if d["status"] == "Finalizado")
-    elements.append(Paragraph(f"Total de demandas: {total} | Finalizadas: {finalizadas}", body_style))
-    elements.append(Spacer(1, 20))
-    
-    # Each demanda
-    for i, doc in enumerate(demandas, 1):
-        elements.append(Paragraph(f"─────────────────────────────────────────", body_style))
-        elements.append(Paragraph(f"<b>{doc['numero']}</b> — {doc['solicitante']}", section_title_style))
-        elements.append(Paragraph(f"Status: {doc['status']}", small_style))
-        elements.append(Spacer(1, 4))
-        elements.append(Paragraph(f"<b>Demanda:</b> {doc['demanda']}", body_style))
-        
-        # Referencias
-        referencias = doc.get("referencias") or []
-        if referencias:
-            ref_text = []
-            for ref in referencias:
-                if ref["type"] == "link":
-                    ref_text.append(f"Link: {ref['url']}")
-                else:
-                    ref_text.append(f"Arquivo: {ref['filename']}")
-            elements.append(Paragraph(f"<b>Referências:</b> {'; '.join(ref_text)}", small_style))
+    async for doc in month_export_docs(month_year):
+        summary.write(csv_line(export_row(doc)))
+        folder = archive_name(doc["numero"].lstrip("#"))
+        try:
+            created_at = datetime.fromisoformat(doc["created_at"])
+        except (KeyError, ValueError):
+            created_at = None
         
-        # Entregas with images
-        entregas = doc.get("entregas") or []
-        if entregas:
-            elements.append(Paragraph("<b>Entregas:</b>", body_style))
-            for entrega in entregas:
-                if entrega["type"] == "link":
-                    elements.append(Paragraph(f"• Link: {entrega['url']}", small_style))
-                else:
-                    elements.append(Paragraph(f"• Arquivo: {entrega['filename']}", small_style))
-                    # If it's an image, try to display it
-                    mime = entrega.get("mime_type", "")
-                    if mime.startswith("image/") and entrega.get("file_data"):
-                        try:
-                            img_data = base64.b64decode(entrega["file_data"])
-                            img_buffer = io.BytesIO(img_data)
-                            
-                            from PIL import Image as PILImage
-                            pil_img = PILImage.open(img_buffer)
-                            img_width, img_height = pil_img.size
-                            
-                            max_width = 12*cm
-                            max_height = 8*cm
-                            
-                            ratio = min(max_width/img_width, max_height/img_height)
-                            new_width = img_width * ratio
-                            new_height = img_height * ratio
-                            
-                            img_buffer.seek(0)
-                            img = Image(img_buffer, width=new_width, height=new_height)
-                            elements.append(Spacer(1, 6))
-                            elements.append(img)
-                        except Exception:
-                            pass
-        
-        elements.append(Spacer(1, 10))
+        files = [(f"{folder}/", item) for item in doc.get("entregas") or []]
+        files += [(f"{folder}/referencias/", item) for item in doc.get("referencias") or []]
+        for prefix, item in files:
+            if item.get("type") != "file" or not item.get("file_id"):
+                continue
+            try:
+                fh = await run_in_threadpool(blob_store.open, item["file_id"])
+            except (OSError, ValueError):
+                logger.warning("Export of %s: blob %s missing", doc["numero"], item["file_id"])
+                continue
+            name = prefix + archive_name(item.get("filename") or item["file_id"])
+            with fh, archive.open(name, item.get("mime_type"), created_at) as member:
+                while True:
+                    chunk = await run_in_threadpool(fh.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    member.write(chunk)
+                    yield archive.drain()
+            yield archive.drain()
+    
+    with summary, archive.open("demandas.csv", "text/csv") as member:
+        summary.seek(0)
+        for chunk in iter(lambda: summary.read(CHUNK_SIZE), ""):
+            member.write(chunk.encode("utf-8"))
+            yield archive.drain()
+    yield archive.close()
+
+
+@app.get("/api/relatorio/{month}/{year}/export")
+async def export_month(month: str, year: str, format: str = "csv"):
+    """Month's demandas as a CSV or XLSX summary, or a ZIP with all their files"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {list(EXPORT_FORMATS)}")
+    
+    month_year = f"{month.zfill(2)}/{year}"
+    if (await get_month_stats(month_year))["total"] == 0:
+        raise HTTPException(status_code=404, detail="Nenhuma demanda encontrada para este mês")
     
-    pdf_doc.build(elements)
-    buffer.seek(0)
+    filename = f"demandas_{month_year.replace('/', '-')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
     
-    filename = f"relatorio_{month_year.replace('/', '-')}.pdf"
+    if format == "xlsx":
+        rows = [export_row(doc) async for doc in month_export_docs(month_year)]
+        content = await run_in_threadpool(build_xlsx, rows)
+        return Response(content, media_type=EXPORT_FORMATS[format], headers=headers)
     
+    body = iter_month_csv(month_year) if format == "csv" else iter_month_zip(month_year)
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Request, MongoDB and report metrics of this process in the Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+
+# ============ DIAGNOSTICS ============
+
+def get_profile_store() -> ProfileStore:
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Perfilamento desativado (PROFILING_ENABLED)")
+    return profile_store
+
+
+@app.get("/api/debug/profiles")
+async def list_profiles():
+    """Saved request profiles, newest first"""
+    return await run_in_threadpool(get_profile_store().list)
+
+
+@app.get("/api/debug/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "prof"):
+    """A saved profile as a pstats dump (snakeviz, pstats) or as text"""
+    store = get_profile_store()
+    try:
+        path = store.path_for(profile_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ID inválido")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    
+    if format == "text":
+        return Response(await run_in_threadpool(store.text, profile_id), media_type="text/plain")
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        iter_file(open(path, "rb")),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
     )
 
 
+@app.get("/api/debug/slow")
+async def get_slow_log():
+    """Recent requests and MongoDB commands above SLOW_REQUEST_MS / SLOW_QUERY_MS"""
+    return {
+        "request_ms": slow_log.request_ms,
+        "query_ms": slow_log.query_ms,
+        "entries": slow_log.entries()
+    }
+
+
 @app.get("/api/months")
-async def get_available_months():
+async def get_available_months(request: Request):
     """Get list of months that have demandas"""
-    pipeline = [
-        {"$group": {"_id": "$month_year"}},
-        {"$sort": {"_id": -1}}
-    ]
-    cursor = demandas_collection.aggregate(pipeline)
-    months = []
-    async for doc in cursor:
-        if doc["_id"]:
-            months.append(doc["_id"])
-    return months
+    seq, settled = await get_change_version()
+    etag = weak_etag("months", seq) if settled else None
+    headers = validator_headers(etag)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    cursor = monthly_stats_collection.find({"total": {"$gt": 0}}, {"_id": 1}).sort("sort_key", -1)
+    return ORJSONResponse([doc["_id"] async for doc in cursor], headers=headers)
+
+
+@app.get("/api/stats/{month}/{year}")
+async def get_stats(month: str, year: str, request: Request):
+    """Counts per status and per solicitante for a month"""
+    month_year = f"{month.zfill(2)}/{year}"
+    # Bumped after each write to the month commits, unlike the change seq
+    etag = weak_etag("stats", month_year, await get_month_version(month_year))
+    headers = validator_headers(etag)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(await get_month_stats(month_year), headers=headers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+import os
+import re
+import hashlib
+import tempfile
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+_BLOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobTooLarge(Exception):
+    """Raised when a stream exceeds the size allowed by ``put_stream``."""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"Blob exceeds {max_size} bytes")
+        self.max_size = max_size
+
+
+class BlobStore:
+    """Content-addressed file store for demanda attachments.
+
+    Files are kept as raw bytes under ``root/ab/cd/<sha256>``; the blob id is
+    the SHA-256 of the content, so identical uploads share one file on disk.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, blob_id: str) -> Path:
+        if not _BLOB_ID_RE.match(blob_id or ""):
+            raise ValueError(f"Invalid blob id: {blob_id!r}")
+        return self.root / blob_id[:2] / blob_id[2:4] / blob_id
+
+    def exists(self, blob_id: str) -> bool:
+        return self.path_for(blob_id).is_file()
+
+    def put_bytes(self, data: bytes) -> dict:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not path.exists():
+            fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            self._commit(tmp_path, path)
+        return {"file_id": digest, "size": len(data), "sha256": digest}
+
+    def put_stream(self, stream, max_size: int = None, chunk_size: int = CHUNK_SIZE) -> dict:
+        """Copy a file-like object into the store one chunk at a time.
+
+        Memory use is bounded by ``chunk_size`` regardless of the stream length;
+        ``BlobTooLarge`` is raised as soon as more than ``max_size`` bytes are read.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge(max_size)
+                    digest.update(chunk)
+                    fh.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        blob_id = digest.hexdigest()
+        self._commit(tmp_path, self.path_for(blob_id))
+        return {"file_id": blob_id, "size": size, "sha256": blob_id}
+
+    def _commit(self, tmp_path, path: Path):
+        if path.exists():
+            os.unlink(tmp_path)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def open(self, blob_id: str):
+        return open(self.path_for(blob_id), "rb")
+
+    def delete(self, blob_id: str):
+        try:
+            self.path_for(blob_id).unlink()
+        except FileNotFoundError:
+            pass
@@ -33,6 +33,15 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Health Check", False, f"Error: {str(e)}")
 
+    def test_metrics(self):
+        """Test Prometheus metrics endpoint"""
+        try:
+            response = requests.get(f"{self.base_url}/api/metrics", timeout=10)
+            success = response.status_code == 200 and 'http_request_duration_seconds' in response.text
+            return self.log_test("Metrics", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Metrics", False, f"Error: {str(e)}")
+
     def test_get_solicitantes(self):
         """Test get solicitantes endpoint"""
         try:
@@ -83,7 +92,7 @@ class SistemaDemandasTester:
             # Test without filters
             response = requests.get(f"{self.base_url}/api/demandas", timeout=10)
             success = response.status_code == 200
-            data = response.json() if success else []
+            data = response.json().get('items', []) if success else []
             
             # Test with filters
             current_year = datetime.now().year
@@ -93,6 +102,57 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Get Demandas", False, f"Error: {str(e)}")
 
+    def test_get_demandas_pagination(self):
+        """Test keyset pagination of the demandas list"""
+        try:
+            response = requests.get(f"{self.base_url}/api/demandas?limit=1", timeout=10)
+            success = response.status_code == 200
+            page = response.json() if success else {}
+            success = success and len(page.get('items', [])) <= 1
+            
+            if success and page.get('next_cursor'):
+                next_page = requests.get(f"{self.base_url}/api/demandas",
+                                         params={'limit': 1, 'cursor': page['next_cursor']}, timeout=10)
+                success = next_page.status_code == 200 and \
+                    next_page.json()['items'][0]['id'] != page['items'][0]['id']
+            
+            return self.log_test("Get Demandas Pagination", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Get Demandas Pagination", False, f"Error: {str(e)}")
+
+    def test_search_accents(self):
+        """Test accent-insensitive prefix search"""
+        if not self.created_demanda_id:
+            return self.log_test("Search Accents", False, "No demanda ID available")
+        
+        try:
+            # The created demanda says "validação"
+            response = requests.get(f"{self.base_url}/api/demandas", params={'search': 'VALIDAC'}, timeout=10)
+            success = response.status_code == 200
+            if success:
+                ids = [item['id'] for item in response.json()['items']]
+                success = self.created_demanda_id in ids
+            return self.log_test("Search Accents", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Search Accents", False, f"Error: {str(e)}")
+
+    def test_demanda_changes(self):
+        """Test delta sync of the demandas list"""
+        try:
+            response = requests.get(f"{self.base_url}/api/demandas", timeout=10)
+            if response.status_code != 200:
+                return self.log_test("Demanda Changes", False, f"Status: {response.status_code}")
+            
+            token = response.json()['sync_token']
+            response = requests.get(f"{self.base_url}/api/demandas/changes", params={'since': token}, timeout=10)
+            success = response.status_code == 200
+            data = response.json() if success else {}
+            if success:
+                success = all(key in data for key in ('items', 'removed', 'reset', 'sync_token'))
+            return self.log_test("Demanda Changes", success, f"Status: {response.status_code}, Items: {len(data.get('items', []))}")
+        except Exception as e:
+            return self.log_test("Demanda Changes", False, f"Error: {str(e)}")
+
     def test_update_demanda_status(self):
         """Test updating demanda status"""
         if not self.created_demanda_id:
@@ -107,6 +167,28 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Update Demanda Status", False, f"Error: {str(e)}")
 
+    def test_bulk_update(self):
+        """Test bulk status change with per-item results"""
+        if not self.created_demanda_id:
+            return self.log_test("Bulk Update", False, "No demanda ID available")
+        
+        try:
+            payload = {
+                'ordered': False,
+                'operations': [
+                    {'op': 'status', 'id': self.created_demanda_id, 'status': 'Em aprovação'},
+                    {'op': 'status', 'id': self.created_demanda_id, 'status': 'Inexistente'}
+                ]
+            }
+            response = requests.post(f"{self.base_url}/api/demandas/bulk", json=payload, timeout=10)
+            success = response.status_code == 200
+            if success:
+                results = response.json()['results']
+                success = [r['status'] for r in results] == ['ok', 'error']
+            return self.log_test("Bulk Update", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Bulk Update", False, f"Error: {str(e)}")
+
     def test_add_entrega(self):
         """Test adding entrega to demanda"""
         if not self.created_demanda_id:
@@ -121,6 +203,110 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Add Entrega", False, f"Error: {str(e)}")
 
+    def test_remove_entrega(self):
+        """Test removing an entrega by its id"""
+        if not self.created_demanda_id:
+            return self.log_test("Remove Entrega", False, "No demanda ID available")
+        
+        try:
+            url = f"{self.base_url}/api/demandas/{self.created_demanda_id}"
+            link = 'https://drive.google.com/to-remove'
+            requests.post(f"{url}/entregas", data={'entrega_links': link}, timeout=10)
+            entregas = requests.get(url, timeout=10).json().get('entregas') or []
+            entrega_id = next((e.get('id') for e in entregas if e.get('url') == link), None)
+            if not entrega_id:
+                return self.log_test("Remove Entrega", False, "Added entrega has no id")
+            
+            response = requests.delete(f"{url}/entregas/{entrega_id}", timeout=10)
+            success = response.status_code == 200
+            if success:
+                entregas = requests.get(url, timeout=10).json().get('entregas') or []
+                repeated = requests.delete(f"{url}/entregas/{entrega_id}", timeout=10)
+                success = all(e.get('id') != entrega_id for e in entregas) and repeated.status_code == 404
+            return self.log_test("Remove Entrega", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Remove Entrega", False, f"Error: {str(e)}")
+
+    def test_attachment_download(self):
+        """Test attachment downloads: full, ranged, conditional, unsatisfiable and stale"""
+        demanda_id = None
+        try:
+            content = b'0123456789' * 500
+            data = {'solicitante': 'Teste API', 'demanda': 'Demanda com arquivo de referência'}
+            files = {'referencia_files': ('referencia.txt', content, 'text/plain')}
+            response = requests.post(f"{self.base_url}/api/demandas", data=data, files=files, timeout=10)
+            if response.status_code != 200:
+                return self.log_test("Attachment Download", False, f"Create status: {response.status_code}")
+            demanda = response.json()
+            demanda_id = demanda['id']
+            url = f"{self.base_url}/api/demandas/{demanda_id}/referencias/0"
+            file_id = demanda['referencias'][0]['file_id']
+            
+            full = requests.get(url, params={'v': file_id}, timeout=10)
+            etag = full.headers.get('ETag')
+            checks = {
+                '200': full.status_code == 200 and full.content == content,
+                'immutable': 'immutable' in full.headers.get('Cache-Control', ''),
+            }
+            
+            ranged = requests.get(url, headers={'Range': 'bytes=100-199'}, timeout=10)
+            checks['206'] = (ranged.status_code == 206 and ranged.content == content[100:200]
+                             and ranged.headers.get('Content-Range') == f"bytes 100-199/{len(content)}")
+            
+            cached = requests.get(url, headers={'If-None-Match': etag}, timeout=10)
+            checks['304'] = cached.status_code == 304
+            
+            beyond = requests.get(url, headers={'Range': f"bytes={len(content)}-"}, timeout=10)
+            checks['416'] = beyond.status_code == 416
+            
+            stale = requests.get(url, params={'v': '0' * 64}, timeout=10)
+            checks['stale 404'] = stale.status_code == 404
+            
+            success = all(checks.values())
+            failed = [name for name, ok in checks.items() if not ok]
+            return self.log_test("Attachment Download", success, f"Failed checks: {failed}" if failed else "")
+        except Exception as e:
+            return self.log_test("Attachment Download", False, f"Error: {str(e)}")
+        finally:
+            if demanda_id:
+                requests.delete(f"{self.base_url}/api/demandas/{demanda_id}", timeout=10)
+
+    def test_events(self):
+        """Test that a status change reaches the /api/events stream"""
+        if not self.created_demanda_id:
+            return self.log_test("Events Stream", False, "No demanda ID available")
+
+        try:
+            with requests.get(f"{self.base_url}/api/events", stream=True, timeout=10) as stream:
+                if stream.status_code != 200:
+                    return self.log_test("Events Stream", False, f"Status: {stream.status_code}")
+                lines = stream.iter_lines(decode_unicode=True)
+                # The retry hint is sent once subscribed, so later writes are not missed
+                next(line for line in lines if line.startswith('retry:'))
+
+                response = requests.put(f"{self.base_url}/api/demandas/{self.created_demanda_id}/status",
+                                        data={'status': 'Finalizado'}, timeout=10)
+                if response.status_code != 200:
+                    return self.log_test("Events Stream", False, f"Update status: {response.status_code}")
+
+                event_name, event = None, None
+                deadline = time.monotonic() + 10
+                for line in lines:
+                    if line.startswith('event:'):
+                        event_name = line[6:].strip()
+                    elif line.startswith('data:') and event_name == 'demanda':
+                        data = json.loads(line[5:])
+                        if data.get('id') == self.created_demanda_id:
+                            event = data
+                            break
+                    if time.monotonic() > deadline:
+                        break
+
+            success = event is not None and event.get('status') == 'Finalizado'
+            return self.log_test("Events Stream", success, f"Event: {event}")
+        except Exception as e:
+            return self.log_test("Events Stream", False, f"Error: {str(e)}")
+
     def test_whatsapp_text(self):
         """Test WhatsApp text generation"""
         if not self.created_demanda_id:
@@ -138,6 +324,22 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("WhatsApp Text", False, f"Error: {str(e)}")
 
+    def test_whatsapp_batch(self):
+        """Test batch WhatsApp messages with a digest"""
+        if not self.created_demanda_id:
+            return self.log_test("WhatsApp Batch", False, "No demanda ID available")
+        
+        try:
+            payload = {'ids': [self.created_demanda_id], 'digest': True}
+            response = requests.post(f"{self.base_url}/api/whatsapp/batch", json=payload, timeout=10)
+            success = response.status_code == 200
+            if success:
+                result = response.json()
+                success = len(result.get('messages', [])) == 1 and bool(result.get('digest'))
+            return self.log_test("WhatsApp Batch", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("WhatsApp Batch", False, f"Error: {str(e)}")
+
     def test_monthly_pdf_report(self):
         """Test monthly PDF report generation"""
         try:
@@ -152,6 +354,44 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Monthly PDF Report", False, f"Error: {str(e)}")
 
+    def test_monthly_report_job(self):
+        """Test asynchronous report job creation and polling"""
+        try:
+            current_month = datetime.now().month
+            current_year = datetime.now().year
+            base = f"{self.base_url}/api/relatorio/{current_month}/{current_year}/jobs"
+            response = requests.post(base, timeout=10)
+            success = response.status_code == 202
+            if not success:
+                return self.log_test("Monthly Report Job", success, f"Status: {response.status_code}")
+            
+            job = response.json()
+            for _ in range(30):
+                job = requests.get(f"{base}/{job['id']}", timeout=10).json()
+                if job['status'] in ('done', 'failed'):
+                    break
+                time.sleep(1)
+            
+            success = job['status'] in ('done', 'failed')
+            if job['status'] == 'done':
+                pdf = requests.get(f"{self.base_url}{job['download_url']}", timeout=15)
+                success = pdf.status_code == 200 and pdf.content.startswith(b'%PDF')
+            return self.log_test("Monthly Report Job", success, f"Job status: {job['status']}")
+        except Exception as e:
+            return self.log_test("Monthly Report Job", False, f"Error: {str(e)}")
+
+    def test_monthly_export(self):
+        """Test CSV export of the current month"""
+        try:
+            now = datetime.now()
+            response = requests.get(f"{self.base_url}/api/relatorio/{now.month:02d}/{now.year}/export",
+                                    params={'format': 'csv'}, timeout=30)
+            success = response.status_code == 200 and 'text/csv' in response.headers.get('content-type', '')
+            lines = response.text.splitlines() if success else []
+            return self.log_test("Monthly Export", success, f"Status: {response.status_code}, Lines: {len(lines)}")
+        except Exception as e:
+            return self.log_test("Monthly Export", False, f"Error: {str(e)}")
+
     def test_get_available_months(self):
         """Test getting available months"""
         try:
@@ -162,6 +402,36 @@ class SistemaDemandasTester:
         except Exception as e:
             return self.log_test("Get Available Months", False, f"Error: {str(e)}")
 
+    def test_conditional_get(self):
+        """Test ETag revalidation of the stats endpoint"""
+        try:
+            now = datetime.now()
+            url = f"{self.base_url}/api/stats/{now.month:02d}/{now.year}"
+            response = requests.get(url, timeout=10)
+            etag = response.headers.get('ETag')
+            if response.status_code != 200 or not etag:
+                return self.log_test("Conditional GET", False, f"Status: {response.status_code}, ETag: {etag}")
+            
+            response = requests.get(url, headers={'If-None-Match': etag}, timeout=10)
+            success = response.status_code == 304
+            return self.log_test("Conditional GET", success, f"Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Conditional GET", False, f"Error: {str(e)}")
+
+    def test_month_stats(self):
+        """Test per-month summary counters"""
+        try:
+            current_month = datetime.now().month
+            current_year = datetime.now().year
+            response = requests.get(f"{self.base_url}/api/stats/{current_month}/{current_year}", timeout=10)
+            success = response.status_code == 200
+            data = response.json() if success else {}
+            if success:
+                success = data['total'] == sum(data['by_status'].values())
+            return self.log_test("Month Stats", success, f"Status: {response.status_code}, Total: {data.get('total')}")
+        except Exception as e:
+            return self.log_test("Month Stats", False, f"Error: {str(e)}")
+
     def cleanup(self):
         """Clean up created test data"""
         if self.created_demanda_id:
@@ -187,11 +457,24 @@ class SistemaDemandasTester:
         time.sleep(1)
         
         self.test_get_demandas()
+        self.test_get_demandas_pagination()
+        self.test_search_accents()
+        self.test_demanda_changes()
         self.test_update_demanda_status()
+        self.test_bulk_update()
         self.test_add_entrega()
+        self.test_remove_entrega()
+        self.test_attachment_download()
+        self.test_events()
         self.test_whatsapp_text()
+        self.test_whatsapp_batch()
         self.test_monthly_pdf_report()
+        self.test_monthly_report_job()
+        self.test_monthly_export()
         self.test_get_available_months()
+        self.test_month_stats()
+        self.test_conditional_get()
+        self.test_metrics()
 
         # Print summary
         print("\n" + "=" * 60)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Toaster, toast } from 'sonner';
 import { 
   Plus, 
@@ -32,9 +32,27 @@ const STATUS_COLORS = {
   "Finalizado": "bg-black text-white border-black"
 };
 
+// Download URL pinned to the content hash so the browser can cache it for good
+const attachmentUrl = (demandaId, field, index, item) =>
+  `${API_URL}/api/demandas/${demandaId}/${field}/${index}${item.file_id ? `?v=${item.file_id}` : ''}`;
+
+const byNewest = (a, b) => b.created_at.localeCompare(a.created_at) || b.id.localeCompare(a.id);
+
+// Applies a delta sync to the loaded list. While more pages remain on the
+// server, changed demandas older than the last loaded one are left to "Carregar mais".
+const mergeDemandaChanges = (demandas, changes, hasMore) => {
+  const changed = new Set([...changes.removed, ...changes.items.map(d => d.id)]);
+  const oldest = demandas[demandas.length - 1];
+  const items = changes.items.filter(d => !hasMore || !oldest || byNewest(d, oldest) <= 0);
+  return [...demandas.filter(d => !changed.has(d.id)), ...items].sort(byNewest);
+};
+
 function App() {
   const [view, setView] = useState('painel'); // 'painel' or 'solicitar'
   const [demandas, setDemandas] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [syncToken, setSyncToken] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [solicitantes, setSolicitantes] = useState([]);
   const [availableMonths, setAvailableMonths] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
@@ -69,27 +87,72 @@ function App() {
   const currentYear = new Date().getFullYear();
   const currentMonth = String(new Date().getMonth() + 1).padStart(2, '0');
 
+  const buildFilterParams = useCallback(() => {
+    const params = new URLSearchParams();
+    if (filterMonth) params.append('month', filterMonth);
+    if (filterYear) params.append('year', filterYear);
+    if (filterStatus) params.append('status', filterStatus);
+    if (filterSolicitante) params.append('solicitante', filterSolicitante);
+    if (searchQuery) params.append('search', searchQuery);
+    return params;
+  }, [filterMonth, filterYear, filterStatus, filterSolicitante, searchQuery]);
+
+  const buildDemandasUrl = useCallback((cursor) => {
+    const params = buildFilterParams();
+    if (cursor) params.append('cursor', cursor);
+    
+    return `${API_URL}/api/demandas${params.toString() ? '?' + params.toString() : ''}`;
+  }, [buildFilterParams]);
+
   const fetchDemandas = useCallback(async () => {
     setIsLoading(true);
     try {
-      const params = new URLSearchParams();
-      if (filterMonth) params.append('month', filterMonth);
-      if (filterYear) params.append('year', filterYear);
-      if (filterStatus) params.append('status', filterStatus);
-      if (filterSolicitante) params.append('solicitante', filterSolicitante);
-      if (searchQuery) params.append('search', searchQuery);
-      
-      const url = `${API_URL}/api/demandas${params.toString() ? '?' + params.toString() : ''}`;
-      const res = await fetch(url);
+      const res = await fetch(buildDemandasUrl());
       if (!res.ok) throw new Error('Erro ao carregar demandas');
       const data = await res.json();
-      setDemandas(data);
+      setDemandas(data.items);
+      setNextCursor(data.next_cursor);
+      setSyncToken(data.sync_token);
     } catch (error) {
       toast.error('Erro ao carregar demandas');
     } finally {
       setIsLoading(false);
     }
-  }, [filterMonth, filterYear, filterStatus, filterSolicitante, searchQuery]);
+  }, [buildDemandasUrl]);
+
+  const loadMoreDemandas = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const res = await fetch(buildDemandasUrl(nextCursor));
+      if (!res.ok) throw new Error('Erro ao carregar demandas');
+      const data = await res.json();
+      setDemandas(prev => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      toast.error('Erro ao carregar demandas');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  // Refresh after a mutation by fetching only what changed since the last sync
+  const syncDemandas = async () => {
+    // Search results are ranked by relevance, which a merge cannot preserve
+    if (!syncToken || searchQuery) return fetchDemandas();
+    try {
+      const params = buildFilterParams();
+      params.append('since', syncToken);
+      const res = await fetch(`${API_URL}/api/demandas/changes?${params.toString()}`);
+      if (!res.ok) throw new Error('Erro ao sincronizar demandas');
+      const data = await res.json();
+      if (data.reset) return fetchDemandas();
+      setDemandas(prev => mergeDemandaChanges(prev, data, Boolean(nextCursor)));
+      setSyncToken(data.sync_token);
+    } catch (error) {
+      fetchDemandas();
+    }
+  };
 
   const fetchSolicitantes = async () => {
     try {
@@ -121,6 +184,40 @@ function App() {
     fetchMonths();
   }, [fetchDemandas]);
 
+  // Live updates: other people's changes arrive over SSE and trigger a delta sync
+  const syncRef = useRef(null);
+  syncRef.current = { syncDemandas, fetchMonths };
+
+  useEffect(() => {
+    const events = new EventSource(`${API_URL}/api/events`);
+    let timer = null;
+    let monthsChanged = false;
+    const scheduleSync = () => {
+      clearTimeout(timer);
+      // Coalesce bursts such as bulk updates into one sync
+      timer = setTimeout(() => {
+        syncRef.current.syncDemandas();
+        if (monthsChanged) syncRef.current.fetchMonths();
+        monthsChanged = false;
+      }, 300);
+    };
+    events.addEventListener('demanda', (e) => {
+      const change = JSON.parse(e.data);
+      if (change.type !== 'updated') monthsChanged = true;
+      scheduleSync();
+    });
+    // Changes made while disconnected were not pushed
+    let opened = false;
+    events.addEventListener('open', () => {
+      if (opened) scheduleSync();
+      opened = true;
+    });
+    return () => {
+      clearTimeout(timer);
+      events.close();
+    };
+  }, []);
+
   const handleCreateSolicitacao = async (e) => {
     e.preventDefault();
     
@@ -146,7 +243,7 @@ function App() {
       const data = await res.json();
       setSuccessData(data);
       resetForm();
-      fetchDemandas();
+      syncDemandas();
       fetchSolicitantes();
       fetchMonths();
     } catch (error) {
@@ -188,7 +285,7 @@ function App() {
       });
       if (!res.ok) throw new Error('Erro ao atualizar status');
       toast.success('Status atualizado');
-      fetchDemandas();
+      syncDemandas();
     } catch (error) {
       toast.error('Erro ao atualizar status');
     }
@@ -217,7 +314,7 @@ function App() {
       setShowEntrega(null);
       setEntregaLinks('');
       setEntregaFiles([]);
-      fetchDemandas();
+      syncDemandas();
     } catch (error) {
       toast.error('Erro ao adicionar entrega');
     }
@@ -232,7 +329,7 @@ function App() {
       });
       if (!res.ok) throw new Error('Erro ao excluir');
       toast.success('Demanda excluída');
-      fetchDemandas();
+      syncDemandas();
     } catch (error) {
       toast.error('Erro ao excluir demanda');
     }
@@ -282,6 +379,40 @@ function App() {
     }
   };
 
+  const handleExportMonth = (format) => {
+    const month = filterMonth || currentMonth;
+    const year = filterYear || currentYear;
+    if (!availableMonths.includes(`${month}/${year}`)) {
+      toast.error('Nenhuma demanda neste mês');
+      return;
+    }
+    // Navigating lets the browser stream the archive straight to disk
+    window.location.href = `${API_URL}/api/relatorio/${month}/${year}/export?format=${format}`;
+  };
+
+  const handleCopyWhatsAppDigest = async () => {
+    const month = filterMonth || currentMonth;
+    const year = filterYear || currentYear;
+    
+    try {
+      const res = await fetch(`${API_URL}/api/whatsapp/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ month, year, status: filterStatus || null, digest: true })
+      });
+      if (!res.ok) throw new Error('Erro');
+      const data = await res.json();
+      if (!data.messages.length) {
+        toast.error('Nenhuma demanda para resumir');
+        return;
+      }
+      const success = await copyToClipboard(data.digest);
+      if (success) toast.success(`Resumo de ${data.messages.length} demandas copiado!`);
+    } catch (error) {
+      toast.error('Erro ao copiar resumo');
+    }
+  };
+
   const resetForm = () => {
     setFormSolicitante('');
     setFormDemanda('');
@@ -513,6 +644,15 @@ function App() {
                   </div>
                 </div>
 
+                <button
+                  onClick={handleCopyWhatsAppDigest}
+                  className="btn-secondary text-sm px-4 py-2"
+                  data-testid="btn-whatsapp-digest"
+                >
+                  <MessageCircle size={16} className="inline mr-2" />
+                  Resumo WhatsApp
+                </button>
+
                 <button
                   onClick={handleDownloadPDF}
                   className="btn-primary text-sm px-4 py-2"
@@ -521,6 +661,15 @@ function App() {
                   <Download size={16} className="inline mr-2" />
                   PDF Mensal
                 </button>
+
+                <button
+                  onClick={() => handleExportMonth('zip')}
+                  className="btn-secondary text-sm px-4 py-2"
+                  data-testid="btn-export-zip"
+                >
+                  <Download size={16} className="inline mr-2" />
+                  Arquivos (ZIP)
+                </button>
               </div>
             </div>
 
@@ -634,6 +783,18 @@ function App() {
                     </div>
                   </div>
                 ))}
+                {nextCursor && (
+                  <div className="text-center pt-2">
+                    <button
+                      onClick={loadMoreDemandas}
+                      disabled={isLoadingMore}
+                      className="btn-secondary"
+                      data-testid="btn-load-more"
+                    >
+                      {isLoadingMore ? 'Carregando...' : 'Carregar mais'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
@@ -774,9 +935,9 @@ function App() {
                             <ExternalLink size={14} /> {ref.url}
                           </a>
                         ) : (
-                          <span className="flex items-center gap-1">
+                          <a href={attachmentUrl(showDetalhes.id, 'referencias', i, ref)} target="_blank" rel="noopener noreferrer" className="text-blue-600 hover:underline flex items-center gap-1">
                             <Paperclip size={14} /> {ref.filename}
-                          </span>
+                          </a>
                         )}
                       </div>
                     ))}
@@ -795,9 +956,19 @@ function App() {
                             <ExternalLink size={14} /> {entrega.url}
                           </a>
                         ) : (
-                          <span className="flex items-center gap-1">
-                            <Paperclip size={14} /> {entrega.filename}
-                          </span>
+                          <a href={attachmentUrl(showDetalhes.id, 'entregas', i, entrega)} target="_blank" rel="noopener noreferrer" className="text-blue-600 hover:underline flex items-center gap-1">
+                            {entrega.derivatives?.thumb ? (
+                              <img
+                                src={`${attachmentUrl(showDetalhes.id, 'entregas', i, entrega)}&variant=thumb`}
+                                alt={entrega.filename}
+                                className="w-16 h-16 object-cover border"
+                                loading="lazy"
+                              />
+                            ) : (
+                              <Paperclip size={14} />
+                            )}
+                            {entrega.filename}
+                          </a>
                         )}
                       </div>
                     ))}